@@ -5,6 +5,7 @@ from loguru import logger
 
 from .banner import print_banner
 from .email import Email
+from .github import Github
 from .log import init_logging
 from .manager import Manager
 from .settings import get_settings
@@ -15,9 +16,15 @@ settings = get_settings()
 init_logging(settings.loguru_config_file)
 print_banner(settings.banner_file)
 
-store = Store(url=settings.database.url, log_level=settings.database.log_level)
+store = Store(settings=settings.database)
+github = Github(
+    token=settings.github_token,
+    settings=settings.github,
+    store=store,
+    read_tokens=settings.github_read_tokens,
+)
 email = None if settings.email is None else Email(settings.email)
-manager = Manager(settings=settings, store=store, email=email)
+manager = Manager(settings=settings, store=store, github=github, email=email)
 
 
 def signal_handler(_signal, _frame) -> None:
@@ -1,5 +1,5 @@
 import abc
-from datetime import datetime
+from datetime import datetime, timedelta
 from functools import wraps
 from typing import Generic, Literal, Optional, TypeVar, Union
 
@@ -12,7 +12,10 @@ from loguru import logger
 from pydantic import BaseModel, Field
 from sqlmodel import Session
 
+from ..budget import BudgetAllocator, Quota, QuotaExceeded, current_quota
 from ..email import Email
+from ..github import Github
+from ..journal import Journal, current_journal
 from ..model import CreateBy, History, HistoryState
 from ..settings import Settings
 from ..store import Store
@@ -53,6 +56,15 @@ class BotSettings(BaseModel):
     immediately: bool = Field(
         default=False, description="Whether to execute the bot immediately after start"
     )
+    priority: int = Field(
+        default=1,
+        ge=0,
+        description="Share of the rate limit budget relative to the other bots",
+    )
+    critical: bool = Field(
+        default=False,
+        description="Whether the bot may spend the budget reserved for critical bots",
+    )
 
 
 def create_trigger(trigger: BotTrigger) -> BaseTrigger:
@@ -70,6 +82,16 @@ def create_trigger(trigger: BotTrigger) -> BaseTrigger:
         )
 
 
+def full_sync_due(last_date: Optional[datetime], interval: int) -> bool:
+    """
+    Whether a full sync is due, `interval` hours after the start of the
+    last completed one at `last_date` (0 to always sync).
+    """
+    if interval == 0 or last_date is None:
+        return True
+    return datetime.now() - last_date >= timedelta(hours=interval)
+
+
 def inject_session(func):
     @wraps(func)
     def wrapper(self: "Bot", *args, **kwargs):
@@ -105,6 +127,11 @@ def inject_state(func):
 
 
 def inject_history(create_by: CreateBy):
+    """
+    Record the run in a `History` row, and the follow and unfollow events
+    of the run in the event journal.
+    """
+
     def decorator(func):
         @wraps(func)
         def wrapper(self: "Bot", *args, **kwargs):
@@ -113,6 +140,8 @@ def inject_history(create_by: CreateBy):
                 raise ValueError("Session is not provided")
 
             history = History(create_by=create_by, state=HistoryState.SUCCESS)
+            journal = Journal(create_by)
+            token = current_journal.set(journal)
 
             try:
                 return func(self, *args, history=history, **kwargs)
@@ -122,7 +151,9 @@ def inject_history(create_by: CreateBy):
                 history.message = str(e)
                 raise e
             finally:
+                current_journal.reset(token)
                 history.end_date = datetime.now()
+                self.store.insert_events(events=journal.events, session=session)
                 self.store.upsert(model=history, session=session)
 
         return wrapper
@@ -130,6 +161,32 @@ def inject_history(create_by: CreateBy):
     return decorator
 
 
+def inject_quota(func):
+    """
+    Grant the bot a request quota for the run. A run that spends its quota
+    stops early and still counts as a success.
+    """
+
+    @wraps(func)
+    def wrapper(self: "Bot", *args, **kwargs):
+        if self.budget is None:
+            return func(self, *args, **kwargs)
+
+        quota = self.budget.grant(
+            self.name, self.settings.priority, self.settings.critical
+        )
+        token = current_quota.set(quota)
+        try:
+            return func(self, *args, **kwargs)
+        except QuotaExceeded as e:
+            logger.warning(f"Stop {self.name} bot: {e}")
+        finally:
+            current_quota.reset(token)
+            logger.info(f"{self.name} bot spent {quota}")
+
+    return wrapper
+
+
 T = TypeVar("T", bound=BotSettings)
 
 
@@ -141,20 +198,41 @@ class Bot(abc.ABC, Generic[T]):
         settings: T,
         g_settings: Settings,
         store: Store,
+        github: Github,
         email: Optional[Email],
         scheduler: BaseScheduler,
+        budget: Optional[BudgetAllocator] = None,
     ):
         self.settings = settings
         self.g_settings = g_settings
         self.store = store
+        self.github = github
         self.email = email
         self.scheduler = scheduler
+        self.budget = budget
         self.id = f"{self.name}:{id(self)}"
 
     @property
     def enabled(self) -> bool:
         return self.settings.enabled
 
+    @property
+    def quota(self) -> Optional[Quota]:
+        """
+        Request quota of the current run, None if the budget is not managed.
+        """
+        return current_quota.get()
+
+    def has_quota(self, **costs: int) -> bool:
+        """
+        Whether the run quota can still pay `costs` requests per resource,
+        e.g. `has_quota(core=2)`.
+        """
+        quota = self.quota
+        if quota is None:
+            return True
+        return all(quota.remaining(resource) >= n for resource, n in costs.items())
+
     @property
     def stopped(self) -> bool:
         return self.scheduler.state == STATE_STOPPED
@@ -1,4 +1,6 @@
-from typing import Literal, Optional
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import List, Literal, Optional, Set
 
 from loguru import logger
 from pydantic import Field, field_validator
@@ -9,12 +11,29 @@ from follower_bot.bots import (
     Bot,
     BotSettings,
     inject_history,
+    inject_quota,
     inject_session,
     inject_state,
 )
-from follower_bot.evaluator import evaluate, infix_to_postfix, scan, validate
-from follower_bot.github import PER_PAGE_MAX, get_user, get_users, put_user_following
-from follower_bot.model import CreateBy, GithubUser, History, State, user2following
+from follower_bot.evaluator import (
+    compile_postfix,
+    infix_to_postfix,
+    profile_keys,
+    scan,
+    to_search_qualifiers,
+    validate,
+)
+from follower_bot.github import PER_PAGE_MAX, SEARCH_RESULTS_MAX
+from follower_bot.model import (
+    CreateBy,
+    GithubUser,
+    History,
+    RejectedUser,
+    State,
+    User,
+    user2following,
+)
+from follower_bot.profile import ProfileResolver
 
 
 class FollowUserBotSettings(BotSettings):
@@ -32,6 +51,20 @@ class FollowUserBotSettings(BotSettings):
     filter_expr: Optional[str] = Field(
         default=None, description="Filter expression for users to follow"
     )
+    concurrency: int = Field(
+        default=4,
+        ge=1,
+        description="Number of concurrent REST profile lookups (GraphQL fallback)",
+    )
+    discovery: Literal["users", "search"] = Field(
+        default="users",
+        description="Candidate discovery: walk all users, or search users with qualifiers compiled from filter_expr",
+    )
+    recheck_after: int = Field(
+        default=720,
+        ge=0,
+        description="Hours before a user rejected by filter_expr is checked again (0 to disable)",
+    )
 
     @field_validator("filter_expr")
     def validate_filter_expr(cls, v) -> Optional[str]:
@@ -49,51 +82,175 @@ class FollowUserBot(Bot[FollowUserBotSettings]):
     def __init__(self, *args, **kwargs):
         super(FollowUserBot, self).__init__(*args, **kwargs)
 
-        self.postfix_tokens = None
+        self.predicate = None
+        self.profile_keys = set()
+        # rejections are only remembered for the expression that made them
+        self.expr_hash: Optional[str] = None
+        self.profiles = ProfileResolver(
+            self.github, self.store, self.g_settings.profile_cache
+        )
+        qualifiers = ["type:user"]
         if self.settings.filter_expr is not None:
-            tokens = scan(self.settings.filter_expr)
-            self.postfix_tokens = infix_to_postfix(tokens)
+            postfix_tokens = infix_to_postfix(scan(self.settings.filter_expr))
+            self.predicate = compile_postfix(postfix_tokens)
+            self.profile_keys = profile_keys(postfix_tokens)
+            if self.settings.recheck_after > 0:
+                self.expr_hash = hashlib.sha1(
+                    self.settings.filter_expr.encode("utf-8")
+                ).hexdigest()
+            qualifiers += to_search_qualifiers(postfix_tokens)
+        self.search_query = " ".join(qualifiers)
 
-    def check_github_user(self, user: GithubUser) -> bool:
-        if self.settings.filter_expr is None:
+    def check_user(self, user: User) -> Optional[bool]:
+        """
+        None means the filter needs the full profile of the user to decide.
+        """
+        if self.predicate is None:
             return True
-        return evaluate(self.postfix_tokens, user)
+        return self.predicate(user)
+
+    def query_rejected(self, users: List[User], session: Session) -> Set[int]:
+        if self.expr_hash is None:
+            return set()
+        return self.store.query_rejected_user_ids(
+            ids=[user.id for user in users],
+            expr_hash=self.expr_hash,
+            now=datetime.now(),
+            session=session,
+        )
+
+    def reject(self, user: User) -> Optional[RejectedUser]:
+        if self.expr_hash is None:
+            return None
+        return RejectedUser(
+            id=user.id,
+            expr_hash=self.expr_hash,
+            recheck_date=datetime.now() + timedelta(hours=self.settings.recheck_after),
+        )
+
+    def search_users(self, state: State) -> List[User]:
+        if state.follow_user_search_query != self.search_query:
+            logger.info(f"Search query changed, reset cursor: {self.search_query}")
+            state.follow_user_search_query = self.search_query
+            state.follow_user_search_created = None
+            state.follow_user_search_page = 1
+
+        query = self.search_query
+        if state.follow_user_search_created is not None:
+            query += f" created:>={state.follow_user_search_created:%Y-%m-%dT%H:%M:%SZ}"
+
+        logger.info(f"Search users: {query}, page {state.follow_user_search_page}")
+        return self.github.search_users(query, page=state.follow_user_search_page)
+
+    def advance_search_cursor(self, state: State, users: List[User]) -> None:
+        if len(users) < PER_PAGE_MAX:
+            # keep the last page, users who join later are appended to it
+            logger.info("No more users found by search, waiting for new users")
+        elif state.follow_user_search_page * PER_PAGE_MAX >= SEARCH_RESULTS_MAX:
+            # search only returns the first 1000 results, move the joined
+            # date cursor forward and start over from the first page
+            last_user = self.github.get_user(user_login=users[-1].login)
+            # kept as naive UTC, as the database returns it
+            created = last_user.created_at.astimezone(timezone.utc).replace(tzinfo=None)
+            previous = state.follow_user_search_created
+            if previous is not None and created <= previous:
+                # more than 1000 matches joined within the same second, the
+                # same query would return the same pages again
+                created = previous + timedelta(seconds=1)
+                logger.warning(f"Search cursor stuck, skip to joined date {created}")
+            state.follow_user_search_created = created
+            state.follow_user_search_page = 1
+        else:
+            state.follow_user_search_page += 1
 
     @inject_session
     @inject_state
     @inject_history(CreateBy.FOLLOW_USER)
+    @inject_quota
     def exec(self, session: Session, state: State, history: History) -> None:
-        for _ in range(self.settings.per_follow_max):
+        search = self.settings.discovery == "search"
+        if self.expr_hash is not None:
+            # expired rejections and those of previous expressions
+            self.store.delete_rejected_users(
+                expr_hash=self.expr_hash, now=datetime.now(), session=session
+            )
+
+        # users in sign-up order, the cursor moves past each completed page
+        pages = (
+            None if search else self.github.iter_users(since=state.follow_user_since)
+        )
+        for _ in range(self.settings.search_page_max):
             if self.stopped:
                 break
 
-            users = get_users(
-                since=state.follow_user_since,
-                token=self.g_settings.github_token,
+            # a page is only worth listing if at least one follow can be paid
+            costs = {"search": 1, "core": 1} if search else {"core": 2}
+            if not self.has_quota(**costs):
+                logger.info(f"Budget exhausted: {self.quota}")
+                break
+
+            if search:
+                users = self.search_users(state)
+            else:
+                page = next(pages)
+                users = page.users
+
+            # users already followed or rejected before are skipped
+            # without any request
+            candidates = [
+                user for user in users if not self.store.is_following(user.id)
+            ]
+            if len(candidates) < len(users):
+                logger.info(
+                    f"Skip {len(users) - len(candidates)} users already followed"
+                )
+            rejected = self.query_rejected(candidates, session)
+            if rejected:
+                candidates = [user for user in candidates if user.id not in rejected]
+                logger.info(f"Skip {len(rejected)} users rejected before")
+
+            # decide what the listing entries allow, only the undecided
+            # users need their profiles, which are read from the profile
+            # cache or batch fetched in order
+            decisions = [self.check_user(user) for user in candidates]
+            pending = [user for user, ok in zip(candidates, decisions) if ok is None]
+            profiles = self.profiles.resolve(
+                pending, self.profile_keys, session, self.settings.concurrency
             )
 
-            for user in users:
+            page_done = True
+            rejections: List[RejectedUser] = []
+            for user, ok in zip(candidates, decisions):
                 if self.stopped:
+                    page_done = False
                     break
 
+                github_user: Optional[GithubUser] = None
                 try:
-                    github_user = get_user(
-                        user_login=user.login,
-                        token=self.g_settings.github_token,
-                    )
+                    if ok is None:
+                        _, github_user, error = next(profiles)
+                        if error is not None:
+                            raise error
+                        ok = self.check_user(github_user)
+                        if not ok:
+                            # only rejections that cost a profile are worth remembering
+                            rejection = self.reject(user)
+                            if rejection is not None:
+                                rejections.append(rejection)
 
-                    if not self.check_github_user(github_user):
-                        logger.info(f"Filtered: {github_user}")
+                    if not ok:
+                        logger.info(f"Filtered: {github_user or user}")
                         continue
 
                     following = user2following(user, CreateBy.FOLLOW_USER)
 
-                    put_user_following(following.login, self.g_settings.github_token)
+                    self.github.put_user_following(following.login)
                     following.followed = True
                     self.store.upsert_following(following=following, session=session)
 
-                    logger.info(f"Followed: {github_user}")
-                    state.follow_user_since = user.id
+                    logger.info(f"Followed: {github_user or user}")
+                    if not search:
+                        state.follow_user_since = user.id
 
                     history.count += 1
                 except RequestException as e:
@@ -103,11 +260,22 @@ class FollowUserBot(Bot[FollowUserBotSettings]):
                     continue
 
                 if history.count >= self.settings.per_follow_max:
+                    page_done = False
                     break
 
-            if len(users) < PER_PAGE_MAX:
+            self.store.upsert_rejected_users(rejections, session=session)
+
+            if search:
+                if page_done:
+                    self.advance_search_cursor(state, users)
+                if len(users) < PER_PAGE_MAX:
+                    break
+            elif page.next is None:
                 logger.info("No more users to follow, stopping bot")
                 self.stop()
+                break
+            elif page_done:
+                state.follow_user_since = page.next
 
             if history.count >= self.settings.per_follow_max:
                 break
@@ -9,6 +9,7 @@ from follower_bot.bots import (
     Bot,
     BotSettings,
     inject_history,
+    inject_quota,
     inject_session,
     inject_state,
 )
@@ -20,6 +21,12 @@ class MailStatsBotSettings(BotSettings):
     name: Literal["MailStatsBot"] = Field(
         default="MailStatsBot", description="Mutual follow bot"
     )
+    # makes no GitHub requests
+    priority: int = Field(
+        default=0,
+        ge=0,
+        description="Share of the rate limit budget relative to the other bots",
+    )
 
 
 class MailStatsBot(Bot[MailStatsBotSettings]):
@@ -35,6 +42,7 @@ class MailStatsBot(Bot[MailStatsBotSettings]):
     @inject_session
     @inject_state
     @inject_history(CreateBy.MAIL_STATS)
+    @inject_quota
     def exec(self, session: Session, state: State, history: History) -> None:
         start_date = state.stat_last_date
         end_date = datetime.now()
@@ -46,12 +54,6 @@ class MailStatsBot(Bot[MailStatsBotSettings]):
             following_count=self.store.query_following_count(session),
         )
 
-        histories = self.store.query_histories(
-            start_date=start_date,
-            end_date=end_date,
-            session=session,
-        )
-
         mappings = {
             CreateBy.FOLLOW_USER: "follow_user_count",
             CreateBy.MUTUAL_FOLLOW: "mutual_follow_count",
@@ -59,10 +61,15 @@ class MailStatsBot(Bot[MailStatsBotSettings]):
             CreateBy.UNFOLLOW_FOLLOWING: "unfollow_following_count",
         }
 
-        for h in histories:
-            field_name = mappings.get(h.create_by)
+        aggregates = self.store.aggregate_histories(
+            start_date=start_date,
+            end_date=end_date,
+            session=session,
+        )
+        for aggregate in aggregates:
+            field_name = mappings.get(aggregate.create_by)
             if field_name is not None:
-                setattr(stats, field_name, getattr(stats, field_name) + h.count)
+                setattr(stats, field_name, getattr(stats, field_name) + aggregate.count)
 
         ok, error = self.email.send_stats(stats)
 
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from typing import Literal
+
+from loguru import logger
+from pydantic import Field
+from sqlmodel import Session
+
+from follower_bot.bots import (
+    Bot,
+    BotSettings,
+    inject_history,
+    inject_quota,
+    inject_session,
+)
+from follower_bot.model import CreateBy, History
+
+
+class MaintenanceBotSettings(BotSettings):
+    name: Literal["MaintenanceBot"] = Field(
+        default="MaintenanceBot", description="Maintenance bot"
+    )
+    # makes no GitHub requests
+    priority: int = Field(
+        default=0,
+        ge=0,
+        description="Share of the rate limit budget relative to the other bots",
+    )
+    event_retention: int = Field(
+        default=720,
+        ge=0,
+        description="Hours events are kept before they are rolled into per-user summaries (0 to keep all)",
+    )
+    history_retention: int = Field(
+        default=2160,
+        ge=0,
+        description="Hours run histories are kept before they are pruned, their runs stay counted in the daily rollup (0 to keep all)",
+    )
+    history_archive: bool = Field(
+        default=False,
+        description="Move pruned histories to the archive table instead of deleting them",
+    )
+    batch_size: int = Field(
+        default=5000, ge=1, description="Rows compacted or pruned per transaction"
+    )
+
+
+class MaintenanceBot(Bot[MaintenanceBotSettings]):
+    name: str = "MaintenanceBot"
+
+    @inject_session
+    @inject_history(CreateBy.MAINTENANCE)
+    @inject_quota
+    def exec(self, session: Session, history: History) -> None:
+        if self.settings.event_retention > 0:
+            before = datetime.now() - timedelta(hours=self.settings.event_retention)
+            count = self.store.compact_events(
+                before=before, batch_size=self.settings.batch_size, session=session
+            )
+            history.count += count
+            logger.info(f"Compacted {count} events")
+
+        if self.settings.history_retention > 0:
+            before = datetime.now() - timedelta(hours=self.settings.history_retention)
+            count = self.store.prune_histories(
+                before=before,
+                batch_size=self.settings.batch_size,
+                archive=self.settings.history_archive,
+                session=session,
+            )
+            history.count += count
+            logger.info(f"Pruned {count} histories")
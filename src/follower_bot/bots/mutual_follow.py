@@ -6,8 +6,13 @@ from pydantic import Field
 from requests.exceptions import RequestException
 from sqlmodel import Session
 
-from follower_bot.bots import Bot, BotSettings, inject_history, inject_session
-from follower_bot.github import put_user_following
+from follower_bot.bots import (
+    Bot,
+    BotSettings,
+    inject_history,
+    inject_quota,
+    inject_session,
+)
 from follower_bot.model import CreateBy, History, user2following
 
 
@@ -26,6 +31,7 @@ class MutualFollowBot(Bot[MutualFollowBotSettings]):
 
     @inject_session
     @inject_history(CreateBy.MUTUAL_FOLLOW)
+    @inject_quota
     def exec(self, session: Session, history: History) -> None:
         result = self.store.query_not_following_followers(
             limit=self.settings.per_mutual_follow_count,
@@ -41,7 +47,7 @@ class MutualFollowBot(Bot[MutualFollowBotSettings]):
 
             try:
                 following.create_by = CreateBy.MUTUAL_FOLLOW
-                put_user_following(follower.login, self.g_settings.github_token)
+                self.github.put_user_following(follower.login)
                 following.last_follow_date = datetime.now()
                 following.followed = True
 
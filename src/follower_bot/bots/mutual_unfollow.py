@@ -5,8 +5,13 @@ from pydantic import Field
 from requests.exceptions import RequestException
 from sqlmodel import Session
 
-from follower_bot.bots import Bot, BotSettings, inject_history, inject_session
-from follower_bot.github import delete_user_following
+from follower_bot.bots import (
+    Bot,
+    BotSettings,
+    inject_history,
+    inject_quota,
+    inject_session,
+)
 from follower_bot.model import CreateBy, History
 
 
@@ -27,6 +32,7 @@ class MutualUnfollowBot(Bot[MutualUnfollowBotSettings]):
 
     @inject_session
     @inject_history(CreateBy.MUTUAL_UNFOLLOW)
+    @inject_quota
     def exec(self, session: Session, history: History) -> None:
         result = self.store.query_unfollow_followers(
             limit=self.settings.per_mutual_unfollow_count,
@@ -37,7 +43,7 @@ class MutualUnfollowBot(Bot[MutualUnfollowBotSettings]):
 
         for follower, following in result:
             try:
-                delete_user_following(follower.login, self.g_settings.github_token)
+                self.github.delete_user_following(follower.login)
                 following.followed = False
                 following.unfollow_count += 1
                 logger.info(f"Unfollow: {follower}")
@@ -1,4 +1,6 @@
-from typing import Literal
+from array import array
+from datetime import datetime
+from typing import Literal, Optional
 
 from loguru import logger
 from pydantic import Field
@@ -7,11 +9,12 @@ from sqlmodel import Session
 from follower_bot.bots import (
     Bot,
     BotSettings,
+    full_sync_due,
     inject_history,
+    inject_quota,
     inject_session,
     inject_state,
 )
-from follower_bot.github import PER_PAGE_MAX, get_user_followers
 from follower_bot.model import CreateBy, History, State, users2followers
 
 
@@ -19,39 +22,134 @@ class SyncFollowerBotSettings(BotSettings):
     name: Literal["SyncFollowerBot"] = Field(
         default="MutualUnfollowBot", description="Mutual unfollow bot"
     )
+    # the mutual bots depend on the synced followers
+    critical: bool = Field(
+        default=True,
+        description="Whether the bot may spend the budget reserved for critical bots",
+    )
+    concurrency: int = Field(
+        default=4,
+        ge=1,
+        description="Number of follower pages fetched concurrently (1 to walk pages by the Link header)",
+    )
+    full_sync_interval: int = Field(
+        default=24,
+        ge=0,
+        description="Hours after which a full sync runs even if the follower count and first page are unchanged (0 to always sync)",
+    )
+    incremental: bool = Field(
+        default=True,
+        description="Between full syncs, only read the newest pages until one holds no new follower",
+    )
 
 
 class SyncFollowerBot(Bot[SyncFollowerBotSettings]):
     name: str = "SyncFollowerBot"
 
+    def full_sync_due(self, state: State) -> bool:
+        return full_sync_due(state.sync_follower_date, self.settings.full_sync_interval)
+
+    def unchanged(self, state: State, count: int, etag: Optional[str]) -> bool:
+        """
+        Whether the follower list looks the same as at the end of the last
+        sync: same count and same first page, which holds the latest changes.
+        """
+        if self.full_sync_due(state):
+            return False
+        return (
+            etag is not None
+            and count == state.sync_follower_count
+            and etag == state.sync_follower_etag
+        )
+
+    def sync_head(
+        self,
+        session: Session,
+        state: State,
+        history: History,
+        count: int,
+        etag: Optional[str],
+    ) -> None:
+        """
+        Followers are listed newest first, read pages until one holds no
+        new follower. Departures are left to the next full sync.
+        """
+        sync_id = self.generate_timestamp()
+        for page in self.github.iter_followers():
+            new_users = self.store.changed_followers(page.users)
+            followers = users2followers(new_users, sync_id)
+            self.store.upsert_followers(followers=followers, session=session)
+            history.count += len(new_users)
+
+            if not new_users or page.next is None or self.stopped:
+                break
+
+        # the count and first page are checked again by the next run
+        state.sync_follower_count = count
+        state.sync_follower_etag = etag
+        logger.info(f"Incremental follower sync done, {history.count} new users")
+
     @inject_session
     @inject_state
     @inject_history(CreateBy.SYNC_FOLLOWER)
+    @inject_quota
     def exec(self, session: Session, state: State, history: History) -> None:
+        count, etag = None, None
+        if state.sync_follower_id is None:
+            # a new sweep, which is skipped if nothing changed
+            count = self.github.get_authenticated_user().followers
+            etag = self.github.get_followers_etag()
+            if self.unchanged(state, count, etag):
+                logger.info(f"Followers unchanged ({count} users), skip sync")
+                return
+            if self.settings.incremental and not self.full_sync_due(state):
+                self.sync_head(session, state, history, count, etag)
+                return
+
         sync_id = self.generate_timestamp(default=state.sync_follower_id)
         logger.debug(f"Sync follower id: {sync_id}")
         state.sync_follower_id = sync_id
+        # the ids of a resumed sweep start at its cursor, too few to find unfollowers
+        resumed = state.sync_follower_page > 1
+        known_ids = self.store.follower_ids()
+        remote_ids = array("q")
 
-        while not self.stopped:
-            logger.info(f"Sync follower page: {state.sync_follower_page}")
-            users = get_user_followers(
-                page=state.sync_follower_page,
-                token=self.g_settings.github_token,
-            )
-
-            followers = users2followers(users, sync_id)
+        logger.info(f"Sync follower page: {state.sync_follower_page}")
+        pages = self.github.iter_followers(
+            page=state.sync_follower_page,
+            workers=self.settings.concurrency,
+            total=count,
+        )
+        for page in pages:
+            remote_ids.extend(user.id for user in page.users)
+            changed = self.store.changed_followers(page.users)
+            followers = users2followers(changed, sync_id)
             self.store.upsert_followers(followers=followers, session=session)
+            history.count += len(page.users)
 
-            state.sync_follower_page += 1
-            users_len = len(users)
-            history.count += users_len
-
-            if users_len < PER_PAGE_MAX:
-                logger.info(f"Sync follower done, total {users_len} users")
+            if page.next is None:
                 state.sync_follower_page = 1
                 state.sync_follower_id = None
+                if resumed:
+                    logger.info(
+                        "Resumed sweep done, unfollowers are left to the next one"
+                    )
+                    break
+                removed = self.store.update_unfollow_followers(
+                    known_ids=known_ids, remote_ids=remote_ids, session=session
+                )
+                logger.info(f"Sync follower done, {removed} unfollowers")
+                state.sync_follower_count = count
+                state.sync_follower_etag = etag
+                # the start of the sweep, so that a daily run finds the next one due
+                state.sync_follower_date = datetime.fromtimestamp(sync_id)
                 break
 
-        self.store.update_unfollow_followers(sync_id=sync_id, session=session)
+            # commit the cursor with the page, an interrupted run resumes from it
+            state.sync_follower_page = page.next
+            self.store.upsert(model=state, session=session)
+            if self.stopped:
+                break
+            logger.info(f"Sync follower page: {state.sync_follower_page}")
 
         logger.info(f"Sync follower done, total {history.count} users")
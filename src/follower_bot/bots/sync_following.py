@@ -1,4 +1,6 @@
-from typing import Literal
+from array import array
+from datetime import datetime
+from typing import Literal, Optional
 
 from loguru import logger
 from pydantic import Field
@@ -7,11 +9,12 @@ from sqlmodel import Session
 from follower_bot.bots import (
     Bot,
     BotSettings,
+    full_sync_due,
     inject_history,
+    inject_quota,
     inject_session,
     inject_state,
 )
-from follower_bot.github import PER_PAGE_MAX, get_user_following
 from follower_bot.model import CreateBy, History, State, users2followings
 
 
@@ -19,37 +22,99 @@ class SyncFollowingBotSettings(BotSettings):
     name: Literal["SyncFollowingBot"] = Field(
         default="SyncFollowingBot", description="Sync following bot"
     )
+    # the mutual bots depend on the synced followings
+    critical: bool = Field(
+        default=True,
+        description="Whether the bot may spend the budget reserved for critical bots",
+    )
+    concurrency: int = Field(
+        default=4,
+        ge=1,
+        description="Number of following pages fetched concurrently (1 to walk pages by the Link header)",
+    )
+    full_sync_interval: int = Field(
+        default=24,
+        ge=0,
+        description="Hours after which a full sync runs even if the following count and first page are unchanged (0 to always sync)",
+    )
 
 
 class SyncFollowingBot(Bot[SyncFollowingBotSettings]):
     name: str = "SyncFollowingBot"
 
+    def full_sync_due(self, state: State) -> bool:
+        return full_sync_due(
+            state.sync_following_date, self.settings.full_sync_interval
+        )
+
+    def unchanged(self, state: State, count: int, etag: Optional[str]) -> bool:
+        """
+        Whether the following list looks the same as at the end of the last
+        sync: same count and same first page, which holds the latest changes.
+        """
+        if self.full_sync_due(state):
+            return False
+        return (
+            etag is not None
+            and count == state.sync_following_count
+            and etag == state.sync_following_etag
+        )
+
     @inject_session
     @inject_state
     @inject_history(CreateBy.SYNC_FOLLOWING)
+    @inject_quota
     def exec(self, session: Session, state: State, history: History) -> None:
+        count, etag = None, None
+        if state.sync_following_id is None:
+            # a new sweep, which is skipped if nothing changed
+            count = self.github.get_authenticated_user().following
+            etag = self.github.get_following_etag()
+            if self.unchanged(state, count, etag):
+                logger.info(f"Followings unchanged ({count} users), skip sync")
+                return
+
         sync_id = self.generate_timestamp(default=state.sync_following_id)
         state.sync_following_id = sync_id
+        # the ids of a resumed sweep start at its cursor, too few to find unfollowings
+        resumed = state.sync_following_page > 1
+        known_ids = self.store.following_ids()
+        remote_ids = array("q")
 
-        while not self.stopped:
-            users = get_user_following(
-                page=state.sync_following_page,
-                token=self.g_settings.github_token,
-            )
-
-            followings = users2followings(users, CreateBy.USER, sync_id)
+        pages = self.github.iter_following(
+            page=state.sync_following_page,
+            workers=self.settings.concurrency,
+            total=count,
+        )
+        for page in pages:
+            remote_ids.extend(user.id for user in page.users)
+            changed = self.store.changed_followings(page.users)
+            followings = users2followings(changed, CreateBy.USER, sync_id)
             self.store.upsert_followings(followings=followings, session=session)
+            history.count += len(page.users)
 
-            state.sync_following_page += 1
-            users_len = len(users)
-            history.count += users_len
-
-            if users_len < PER_PAGE_MAX:
-                logger.info(f"Sync following done, total {users_len} users")
+            if page.next is None:
                 state.sync_following_page = 1
                 state.sync_following_id = None
+                if resumed:
+                    logger.info(
+                        "Resumed sweep done, unfollowings are left to the next one"
+                    )
+                    break
+                removed = self.store.update_unfollow_followings(
+                    known_ids=known_ids, remote_ids=remote_ids, session=session
+                )
+                logger.info(f"Sync following done, {removed} unfollowed users")
+                state.sync_following_count = count
+                state.sync_following_etag = etag
+                # the start of the sweep, so that a daily run finds the next one due
+                state.sync_following_date = datetime.fromtimestamp(sync_id)
                 break
 
-        self.store.update_unfollow_followings(sync_id=sync_id, session=session)
+            # commit the cursor with the page, an interrupted run resumes from it
+            state.sync_following_page = page.next
+            self.store.upsert(model=state, session=session)
+            if self.stopped:
+                break
 
         logger.info(f"Sync following done, total {history.count} users")
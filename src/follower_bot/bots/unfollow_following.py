@@ -9,12 +9,20 @@ from follower_bot.bots import (
     Bot,
     BotSettings,
     inject_history,
+    inject_quota,
     inject_session,
     inject_state,
 )
-from follower_bot.evaluator import evaluate, infix_to_postfix, scan, validate
-from follower_bot.github import PER_PAGE_MAX, delete_user_following, get_user
-from follower_bot.model import CreateBy, GithubUser, History, State
+from follower_bot.evaluator import (
+    compile_postfix,
+    infix_to_postfix,
+    profile_keys,
+    scan,
+    validate,
+)
+from follower_bot.github import PER_PAGE_MAX
+from follower_bot.model import CreateBy, History, State, User
+from follower_bot.profile import ProfileResolver
 
 
 class UnfollowFollowingBotSettings(BotSettings):
@@ -32,6 +40,11 @@ class UnfollowFollowingBotSettings(BotSettings):
     filter_expr: Optional[str] = Field(
         default=None, description="Filter expression for users to unfollow"
     )
+    concurrency: int = Field(
+        default=4,
+        ge=1,
+        description="Number of concurrent REST profile lookups (GraphQL fallback)",
+    )
 
     @field_validator("filter_expr")
     def validate_filter_expr(cls, v) -> Optional[str]:
@@ -49,24 +62,37 @@ class UnfollowFollowingBot(Bot[UnfollowFollowingBotSettings]):
     def __init__(self, *args, **kwargs):
         super(UnfollowFollowingBot, self).__init__(*args, **kwargs)
 
-        self.postfix_tokens = None
+        self.predicate = None
+        self.profile_keys = set()
+        self.profiles = ProfileResolver(
+            self.github, self.store, self.g_settings.profile_cache
+        )
         if self.settings.filter_expr is not None:
-            tokens = scan(self.settings.filter_expr)
-            self.postfix_tokens = infix_to_postfix(tokens)
-
-    def check_github_user(self, user: GithubUser) -> bool:
-        if self.settings.filter_expr is None:
+            postfix_tokens = infix_to_postfix(scan(self.settings.filter_expr))
+            self.predicate = compile_postfix(postfix_tokens)
+            self.profile_keys = profile_keys(postfix_tokens)
+
+    def check_user(self, user: User) -> Optional[bool]:
+        """
+        None means the filter needs the full profile of the user to decide.
+        """
+        if self.predicate is None:
             return True
-        return evaluate(self.postfix_tokens, user)
+        return self.predicate(user)
 
     @inject_session
     @inject_state
     @inject_history(CreateBy.UNFOLLOW_FOLLOWING)
+    @inject_quota
     def exec(self, session: Session, state: State, history: History) -> None:
         for _ in range(self.settings.page_max):
             if self.stopped:
                 break
 
+            if not self.has_quota(core=1):
+                logger.info(f"Budget exhausted: {self.quota}")
+                break
+
             followings = self.store.query_followed_followings(
                 since=state.unfollow_following_since,
                 limit=PER_PAGE_MAX,
@@ -76,21 +102,31 @@ class UnfollowFollowingBot(Bot[UnfollowFollowingBotSettings]):
             followings_len = len(followings)
             logger.info(f"Unfollow {followings_len} followings")
 
-            for following in followings:
+            # decide what the stored followings allow, only the undecided
+            # users need their profiles, which are read from the profile
+            # cache or batch fetched in order
+            decisions = [self.check_user(following) for following in followings]
+            pending = [f for f, ok in zip(followings, decisions) if ok is None]
+            profiles = self.profiles.resolve(
+                pending, self.profile_keys, session, self.settings.concurrency
+            )
+
+            for following, ok in zip(followings, decisions):
                 if self.stopped:
                     break
 
                 try:
-                    if self.settings.filter_expr is not None:
-                        github_user = get_user(
-                            user_login=following.login,
-                            token=self.g_settings.github_token,
-                        )
-                        if not self.check_github_user(github_user):
-                            logger.info(f"Skip following: {following}")
-                            continue
-
-                    delete_user_following(following.login, self.g_settings.github_token)
+                    if ok is None:
+                        _, github_user, error = next(profiles)
+                        if error is not None:
+                            raise error
+                        ok = self.check_user(github_user)
+
+                    if not ok:
+                        logger.info(f"Skip following: {following}")
+                        continue
+
+                    self.github.delete_user_following(following.login)
                     following.followed = False
                     following.unfollow_count += 1
 
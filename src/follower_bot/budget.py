@@ -0,0 +1,133 @@
+import math
+import sys
+import threading
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from loguru import logger
+from rate_keeper import RateKeeper
+
+# shortest rate limit window (seconds) that is split into run quotas
+QUOTA_MIN_PERIOD = 3600
+
+
+class QuotaExceeded(Exception):
+    """
+    Raised when a bot run has spent the request quota granted to it.
+    """
+
+
+class Quota:
+    """
+    Request quota of a single bot run, per rate limit resource.
+    """
+
+    def __init__(self, name: str, limits: Dict[str, int]):
+        self.name = name
+        self.limits = limits
+        self.used: Dict[str, int] = {resource: 0 for resource in limits}
+        self._lock = threading.Lock()
+
+    def remaining(self, resource: str = "core") -> int:
+        if resource not in self.limits:
+            return sys.maxsize
+        return max(0, self.limits[resource] - self.used[resource])
+
+    def check(self, resource: str = "core") -> None:
+        if self.remaining(resource) == 0:
+            raise QuotaExceeded(
+                f"{self.name} used its {resource} quota of {self.limits[resource]} requests"
+            )
+
+    def consume(self, resource: str = "core") -> None:
+        if resource not in self.limits:
+            return
+        with self._lock:
+            self.used[resource] += 1
+
+    def __str__(self):
+        usage = ", ".join(
+            f"{resource}={self.used[resource]}/{limit}"
+            for resource, limit in self.limits.items()
+        )
+        return f"Quota({self.name}: {usage})"
+
+
+# quota of the bot run in the current context, copied into worker threads
+current_quota: ContextVar[Optional[Quota]] = ContextVar("current_quota", default=None)
+
+
+def available(rate_keeper: RateKeeper) -> int:
+    """
+    Requests left in the current window, the whole limit once it has reset.
+    """
+    if rate_keeper.remaining_period == 0:
+        return rate_keeper.limit
+    return rate_keeper.remaining
+
+
+def check_quota(resource: str) -> None:
+    """
+    Raise QuotaExceeded before a request the run quota cannot pay for.
+    """
+    quota = current_quota.get()
+    if quota is not None:
+        quota.check(resource)
+
+
+def consume_quota(resource: str) -> None:
+    """
+    Charge a response to the run quota, only responses GitHub counts
+    against the rate limit are charged.
+    """
+    quota = current_quota.get()
+    if quota is not None:
+        quota.consume(resource)
+
+
+class BudgetAllocator:
+    """
+    Split the GitHub rate limit budget between bots. A fraction of every
+    resource is reserved for critical bots, the rest is shared in
+    proportion to the bot priorities. Quotas are granted from the budget
+    remaining when a run starts, summed over the buckets of all tokens.
+    Resources with a short window (search) have no quota and are only paced.
+    """
+
+    def __init__(
+        self,
+        rate_keepers: Dict[str, List[RateKeeper]],
+        reserve: float,
+        priorities: Dict[str, int],
+    ):
+        self.rate_keepers = rate_keepers
+        self.reserve = reserve
+        # priorities of the enabled non-critical bots, keyed by bot name
+        self.priorities = priorities
+
+    def limit(self, resource: str = "core") -> int:
+        return sum(rate_keeper.limit for rate_keeper in self.rate_keepers[resource])
+
+    def remaining(self, resource: str = "core") -> int:
+        return sum(
+            available(rate_keeper) for rate_keeper in self.rate_keepers[resource]
+        )
+
+    def grant(self, name: str, priority: int, critical: bool) -> Quota:
+        limits: Dict[str, int] = {}
+        for resource, rate_keepers in self.rate_keepers.items():
+            # a bucket that refills within a run is left to the rate keeper
+            # pacing, a quota from its budget at the start would be too small
+            if any(keeper.period < QUOTA_MIN_PERIOD for keeper in rate_keepers):
+                continue
+
+            remaining = self.remaining(resource)
+            if not critical:
+                remaining -= math.ceil(self.limit(resource) * self.reserve)
+                total = sum(self.priorities.values()) or 1
+                remaining = math.floor(remaining * priority / total)
+            limits[resource] = max(0, remaining)
+
+        quota = Quota(name, limits)
+        logger.debug(f"Granted {quota}")
+        return quota
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+from pydantic import BaseModel, Field
+from sqlmodel import Session
+
+from .model import CachedResponse
+from .store import Store
+
+# pending writes that trigger a flush to the store
+FLUSH_SIZE = 100
+
+
+class CacheEntry(BaseModel):
+    etag: Optional[str] = Field(default=None, description="ETag of the response")
+    last_modified: Optional[str] = Field(
+        default=None, description="Last-Modified of the response"
+    )
+    link: Optional[str] = Field(default=None, description="Link header of the response")
+    data: Any = Field(description="Parsed JSON body of the response")
+
+
+def cache_key(url: str, params: Optional[Dict] = None) -> str:
+    raw = json.dumps([url, sorted((params or {}).items())], default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU cache of response validators (ETag/Last-Modified) and parsed bodies,
+    persisted to the store so that conditional requests survive restarts.
+    Writes and accesses are buffered and flushed in batches outside the
+    cache lock, and on close.
+    """
+
+    def __init__(self, max_size: int, store: Optional[Store] = None):
+        self.max_size = max_size
+        self.store = store
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.RLock()
+        # access dates of the entries to persist, and keys evicted since the last flush
+        self._pending: Dict[str, datetime] = {}
+        self._evicted: Set[str] = set()
+        # serializes flushes, so that an older batch never overwrites a newer one
+        self._flush_lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if self.store is None or self.max_size <= 0:
+            return
+
+        with Session(self.store.engine) as session:
+            rows = self.store.query_cached_responses(
+                limit=self.max_size, session=session
+            )
+
+        # rows are ordered from most to least recently used
+        for row in reversed(rows):
+            self._entries[row.key] = CacheEntry(
+                etag=row.etag,
+                last_modified=row.last_modified,
+                link=row.link,
+                data=json.loads(row.body),
+            )
+        logger.debug(f"Loaded {len(self._entries)} cached responses")
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            pending = self._touch(key)
+        self._maybe_flush(pending)
+        return entry
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            pending = self._touch(key)
+
+            while len(self._entries) > self.max_size:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self._pending.pop(evicted_key, None)
+                self._evicted.add(evicted_key)
+        self._maybe_flush(pending)
+
+    def _touch(self, key: str) -> int:
+        if self.store is None:
+            return 0
+        self._pending[key] = datetime.now()
+        self._evicted.discard(key)
+        return len(self._pending) + len(self._evicted)
+
+    def _maybe_flush(self, pending: int) -> None:
+        if pending >= FLUSH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write the pending entries and evictions to the store.
+        """
+        if self.store is None:
+            return
+
+        with self._flush_lock:
+            with self._lock:
+                touched: List[Tuple[str, CacheEntry, datetime]] = [
+                    (key, self._entries[key], access_date)
+                    for key, access_date in self._pending.items()
+                    if key in self._entries
+                ]
+                evicted = list(self._evicted)
+                self._pending.clear()
+                self._evicted.clear()
+            if not touched and not evicted:
+                return
+
+            cached_responses = [
+                CachedResponse(
+                    key=key,
+                    etag=entry.etag,
+                    last_modified=entry.last_modified,
+                    link=entry.link,
+                    body=json.dumps(entry.data),
+                    access_date=access_date,
+                )
+                for key, entry, access_date in touched
+            ]
+            with Session(self.store.engine) as session:
+                self.store.upsert_cached_responses(cached_responses, session=session)
+                if evicted:
+                    self.store.delete_cached_responses(evicted, session=session)
+            logger.debug(
+                f"Flushed {len(touched)} cached responses, {len(evicted)} evicted"
+            )
+
+    def close(self) -> None:
+        self.flush()
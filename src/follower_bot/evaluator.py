@@ -3,18 +3,22 @@ import operator
 import re
 from datetime import datetime, timezone
 from enum import IntEnum
-from typing import Any, Callable, List
+from typing import Any, Callable, List, NamedTuple, Optional, Set, Tuple
 
 from pydantic import BaseModel, Field
 
-from .model import GithubUser
+from .model import User
+
+Check = Callable[[Any], bool]
+# three-valued: None when the user object lacks the data to decide
+Predicate = Callable[[User], Optional[bool]]
 
 
 class FilterRule(BaseModel):
     filter_keys: List[str] = Field(description="Filter keys")
     pattern: str = Field(description="Filter rule in regular expression format")
-    check_func: Callable[[str, Any], bool] = Field(
-        description="Check function to filter users"
+    compile_func: Callable[[str], Check] = Field(
+        description="Compile a rule value into a check function to filter users"
     )
 
 
@@ -26,50 +30,66 @@ operator_mapping = {
 }
 
 
-def check_number(rule: str, value: int) -> bool:
+def compile_number(rule: str) -> Check:
     if ".." in rule:
-        start, end = rule.split("..", 1)
-        return start <= str(value) <= end
+        start, end = (int(x) for x in rule.split("..", 1))
+        return lambda value: start <= value <= end
+
+    match = re.match(r"([><]=?)(\d+)", rule)
+    if match is None:
+        num = int(rule)
+        return lambda value: value == num
+
+    op, num = match.group(1), int(match.group(2))
+    compare = operator_mapping[op]
+    return lambda value: compare(value, num)
 
-    op, num = re.match(r"([><]=?)(\d+)", rule).groups()
-    return operator_mapping[op](value, int(num))
 
+def compile_string(rule: str) -> Check:
+    needle = rule.replace("+", " ").lower()
+    return lambda value: needle in value.lower()
 
-def check_string(rule: str, value: str) -> bool:
-    rule = rule.replace("+", " ")
-    return rule.lower() in value.lower()
 
+def _parse_date(date_str: str) -> datetime:
+    return datetime.fromisoformat(date_str).replace(tzinfo=timezone.utc)
 
-def check_date(rule: str, value: datetime) -> bool:
+
+def compile_date(rule: str) -> Check:
     if ".." in rule:
         start, end = rule.split("..", 1)
-        start_date = datetime.fromisoformat(start).replace(tzinfo=timezone.utc)
-        end_date = datetime.fromisoformat(end).replace(tzinfo=timezone.utc)
-        return start_date <= value <= end_date
-    else:
-        op, date_str = re.match(r"([><]=?)(\d{4}-\d{2}-\d{2})", rule).groups()
-        date = datetime.fromisoformat(date_str).replace(tzinfo=timezone.utc)
-        return operator_mapping[op](value, date)
+        start_date, end_date = _parse_date(start), _parse_date(end)
+        return lambda value: start_date <= value <= end_date
+
+    match = re.match(r"([><]=?)(\d{4}-\d{2}-\d{2})", rule)
+    if match is None:
+        day = _parse_date(rule).date()
+        return lambda value: value.date() == day
+
+    date = _parse_date(match.group(2))
+    compare = operator_mapping[match.group(1)]
+    return lambda value: compare(value, date)
 
 
 filter_rules: List[FilterRule] = [
     FilterRule(
         filter_keys=["repos", "gists", "followers", "following"],
         pattern=r"^((\d+\.\.)|(([><]=?)?))\d+$",
-        check_func=check_number,
+        compile_func=compile_number,
     ),
     FilterRule(
         filter_keys=["login", "name", "company", "location", "email"],
         pattern=r"^.*$",
-        check_func=check_string,
+        compile_func=compile_string,
     ),
     FilterRule(
         filter_keys=["updated"],
         pattern=r"^((\d{4}-\d{2}-\d{2}\.\.)|(([><]=?)?))\d{4}-\d{2}-\d{2}$",
-        check_func=check_date,
+        compile_func=compile_date,
     ),
 ]
 
+filter_rule_mapping = {key: rule for rule in filter_rules for key in rule.filter_keys}
+
 supported_keys = list(
     itertools.chain.from_iterable(rule.filter_keys for rule in filter_rules)
 )
@@ -137,9 +157,15 @@ def infix_to_postfix(tokens: List[Token]) -> List[Token]:
     stack: List[Token] = []
     postfix: List[Token] = []
 
+    def pop_not() -> None:
+        # `!` binds tighter than `&` and `|`, it applies to the operand just closed
+        while stack and stack[-1].type == TokenType.NOT:
+            postfix.append(stack.pop())
+
     for token in tokens:
         if token.type == TokenType.RULE:
             postfix.append(token)
+            pop_not()
         elif token.type == TokenType.NOT:
             stack.append(token)
         elif token.type == TokenType.LPAREN:
@@ -148,6 +174,7 @@ def infix_to_postfix(tokens: List[Token]) -> List[Token]:
             while stack[-1].type != TokenType.LPAREN:
                 postfix.append(stack.pop())
             stack.pop()
+            pop_not()
         elif token.type in (TokenType.AND, TokenType.OR):
             while stack and stack[-1].type in (TokenType.AND, TokenType.OR):
                 postfix.append(stack.pop())
@@ -182,15 +209,13 @@ def validate(tokens: List[Token]) -> None:
                 raise ValueError(f"Invalid rule: {token}")
 
             name, value = token.value.split(":", 1)
-            for rule in filter_rules:
-                if name in rule.filter_keys:
-                    if not re.match(rule.pattern, value):
-                        raise ValueError(f"Invalid rule: {token}")
-                    break
-            else:
+            rule = filter_rule_mapping.get(name)
+            if rule is None:
                 raise ValueError(
                     f"Unsupported rule: {token}, supported rules: {supported_keys}"
                 )
+            if not re.match(rule.pattern, value):
+                raise ValueError(f"Invalid rule: {token}")
 
             expected = [TokenType.AND, TokenType.OR, TokenType.RPAREN]
 
@@ -215,35 +240,150 @@ def validate(tokens: List[Token]) -> None:
         raise ValueError(f"Mismatched parentheses: {paren_stack[-1]}")
 
 
-def evaluate(postfix_tokens: List[Token], user: GithubUser) -> bool:
-    def rule_token_to_bool(rule_token: Token, user: GithubUser) -> bool:
-        key, rule = rule_token.value.split(":", 1)
-        for rule_item in filter_rules:
-            if key not in rule_item.filter_keys:
-                continue
-            value = getattr(user, key)
-            if value is None:
-                # default to True if the value is None
-                return False
-            return rule_item.check_func(rule, value)
-        return False
-
-    stack: List[bool] = []
+# qualifiers of https://docs.github.com/en/search-github/searching-on-github/searching-users
+# whose semantics match the filter rules exactly
+search_qualifier_keys = {
+    "repos": "repos",
+    "followers": "followers",
+}
+
+
+def to_search_qualifiers(postfix_tokens: List[Token]) -> List[str]:
+    """
+    Translate the rules every matching user must satisfy (the top-level
+    conjunction) into user search qualifiers. Rules under `|` or `!` are
+    not translated, so the qualifiers only narrow the candidates and the
+    expression still has to be evaluated on each user.
+    """
+    stack: List[List[Token]] = []
+    for token in postfix_tokens:
+        if token.type == TokenType.RULE:
+            stack.append([token])
+        elif token.type == TokenType.AND:
+            b = stack.pop()
+            a = stack.pop()
+            stack.append(a + b)
+        elif token.type == TokenType.OR:
+            stack.pop()
+            stack.pop()
+            stack.append([])
+        elif token.type == TokenType.NOT:
+            stack.pop()
+            stack.append([])
+
+    qualifiers: List[str] = []
+    for token in stack.pop() if stack else []:
+        key, rule = token.value.split(":", 1)
+        if key in search_qualifier_keys:
+            qualifiers.append(f"{search_qualifier_keys[key]}:{rule}")
+    return qualifiers
+
+
+class Node(NamedTuple):
+    predicate: Predicate
+    # whether the node can be decided from a user listing entry (`User`)
+    # without fetching the full profile (`GithubUser`)
+    cheap: bool
+
+
+# keys available on every user listing entry
+cheap_keys = set(User.model_fields)
+
+_MISSING = object()
+
+
+def profile_keys(tokens: List[Token]) -> Set[str]:
+    """
+    Keys of the rules that need the full profile (`GithubUser`) to decide.
+    """
+    keys = {
+        token.value.split(":", 1)[0] for token in tokens if token.type == TokenType.RULE
+    }
+    return keys - cheap_keys
+
+
+def compile_rule(token: Token) -> Node:
+    key, rule = token.value.split(":", 1)
+    check = filter_rule_mapping[key].compile_func(rule)
+
+    def predicate(user: User) -> Optional[bool]:
+        value = getattr(user, key, _MISSING)
+        if value is _MISSING:
+            return None
+        if value is None:
+            # default to False if the value is None
+            return False
+        return check(value)
+
+    return Node(predicate, key in cheap_keys)
+
+
+def _cheap_first(a: Node, b: Node) -> Tuple[Node, Node]:
+    # operands have no side effects, evaluate the cheap one first so it can
+    # decide the result before the expensive one is needed
+    return (b, a) if b.cheap and not a.cheap else (a, b)
+
+
+def _compile_and(a: Node, b: Node) -> Node:
+    a, b = _cheap_first(a, b)
+
+    def predicate(user: User) -> Optional[bool]:
+        x = a.predicate(user)
+        if x is False:
+            return False
+        y = b.predicate(user)
+        if y is False:
+            return False
+        return None if x is None or y is None else True
+
+    return Node(predicate, a.cheap and b.cheap)
+
+
+def _compile_or(a: Node, b: Node) -> Node:
+    a, b = _cheap_first(a, b)
+
+    def predicate(user: User) -> Optional[bool]:
+        x = a.predicate(user)
+        if x is True:
+            return True
+        y = b.predicate(user)
+        if y is True:
+            return True
+        return None if x is None or y is None else False
+
+    return Node(predicate, a.cheap and b.cheap)
+
+
+def _compile_not(a: Node) -> Node:
+    def predicate(user: User) -> Optional[bool]:
+        x = a.predicate(user)
+        return None if x is None else not x
+
+    return Node(predicate, a.cheap)
+
+
+def compile_postfix(postfix_tokens: List[Token]) -> Predicate:
+    """
+    Compile postfix tokens into a three-valued predicate. On a `GithubUser`
+    the result is always a bool; on a `User` listing entry it is None when
+    the rules that decide it need the full profile.
+    """
+    stack: List[Node] = []
     for token in postfix_tokens:
         if token.type == TokenType.RULE:
-            stack.append(rule_token_to_bool(token, user))
+            stack.append(compile_rule(token))
         elif token.type == TokenType.AND:
             b = stack.pop()
             a = stack.pop()
-            stack.append(a and b)
+            stack.append(_compile_and(a, b))
         elif token.type == TokenType.OR:
             b = stack.pop()
             a = stack.pop()
-            stack.append(a or b)
+            stack.append(_compile_or(a, b))
         elif token.type == TokenType.NOT:
             a = stack.pop()
-            stack.append(not a)
+            stack.append(_compile_not(a))
 
     if not stack:
-        return True
-    return stack.pop()
+        return lambda user: True
+    return stack.pop().predicate
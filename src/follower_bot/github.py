@@ -1,13 +1,69 @@
+import math
+import time
 from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
 
 import requests
 from loguru import logger
 from rate_keeper import RateKeeper
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+from requests.utils import parse_header_links
+from urllib3.util.retry import Retry
 
+from .budget import available, check_quota, consume_quota
+from .cache import CacheEntry, ResponseCache, cache_key
 from .model import GithubUser, User
+from .pacing import WritePacer
+from .pool import bounded_map
+from .settings import GithubSettings
+from .store import Store
 
 PER_PAGE_MAX = 100
+# https://docs.github.com/en/rest/search/search#about-search
+SEARCH_RESULTS_MAX = 1000
+API_URL = "https://api.github.com"
+GRAPHQL_URL = f"{API_URL}/graphql"
+# GraphQL queries are POST requests as well, but they only read
+WRITE_METHODS = {"POST", "PATCH", "PUT", "DELETE"}
+# https://docs.github.com/en/rest/using-the-rest-api/best-practices-for-using-the-rest-api#handle-rate-limit-errors-appropriately
+SECONDARY_RATE_LIMIT_WAIT = 60
+
+# https://docs.github.com/en/graphql/reference/objects#user
+GRAPHQL_USER_FIELDS = """
+    databaseId
+    login
+    name
+    company
+    location
+    email
+    repositories(ownerAffiliations: OWNER, privacy: PUBLIC) { totalCount }
+    gists(privacy: PUBLIC) { totalCount }
+    followers { totalCount }
+    following { totalCount }
+    updatedAt
+    createdAt
+"""
+
+
+class Page(NamedTuple):
+    users: List[User]
+    # cursor of the next page (`page` or `since`), None on the last page
+    next: Optional[int]
+
+
+def next_link_cursor(link: str, cursor: str) -> Optional[int]:
+    """
+    Value of the `cursor` query parameter in the rel="next" URL of a Link
+    header, None if there is no next page.
+    """
+    for link_value in parse_header_links(link):
+        if link_value.get("rel") == "next":
+            query = parse_qs(urlparse(link_value["url"]).query)
+            return int(query[cursor][0])
+    return None
 
 
 # UTC timestamp clock
@@ -15,110 +71,556 @@ def timestamp_clock():
     return datetime.now(timezone.utc).timestamp()
 
 
-# https://docs.github.com/en/rest/using-the-rest-api/rate-limits-for-the-rest-api
-rate_keeper = RateKeeper(limit=5000, period=3600, clock=timestamp_clock)
-
-
-def _create_headers(token: str) -> Dict[str, str]:
-    return {
-        "Accept": "application/vnd.github.v3+json",
-        "User-Agent": "Follower Bot",
-        "Authorization": f"token {token}",
-    }
-
-
-@rate_keeper.decorator
-def _fetch(
-    method: str, url: str, headers: Optional[Dict] = None, params: Optional[Dict] = None
-) -> requests.Response:
-    logger.debug(f"Delay for {rate_keeper.delay_time:.2f} seconds")
-    response = requests.request(method, url, headers=headers, params=params)
-
-    headers_map = {
-        "x-ratelimit-limit": lambda x: setattr(rate_keeper, "limit", int(x)),
-        "x-ratelimit-used": lambda x: setattr(rate_keeper, "used", int(x)),
-        "x-ratelimit-reset": lambda x: setattr(rate_keeper, "reset", float(x)),
-    }
-
-    for key, value in response.headers.items():
-        lower_key = key.lower()
-        if lower_key in headers_map:
-            headers_map[lower_key](value)
-
-    logger.debug(f"Recommended delay : {rate_keeper.recommend_delay:.2f} seconds")
-    logger.debug(f"Rate Keeper: {rate_keeper}")
-    return response
-
-
-def get_users(since: int, token: str, per_page: int = PER_PAGE_MAX) -> List[User]:
-    # https://docs.github.com/zh/rest/users/users#list-users
-    url = "https://api.github.com/users"
-    params = {
-        "since": since,
-        "per_page": per_page,
-    }
-    headers = _create_headers(token)
-    response: requests.Response = _fetch("GET", url, headers=headers, params=params)
-    response.raise_for_status()
-    data = response.json()
-    return [User(**user) for user in data]
-
-
-def put_user_following(user_login: str, token: str) -> bool:
-    # https://docs.github.com/en/rest/users/followers#follow-a-user
-    url = f"https://api.github.com/user/following/{user_login}"
-    headers = _create_headers(token)
-    response: requests.Response = _fetch("PUT", url, headers=headers)
-    response.raise_for_status()
-    return response.status_code == 204
-
-
-def delete_user_following(user_login: str, token: str) -> bool:
-    # https://docs.github.com/en/rest/users/followers#unfollow-a-user
-    url = f"https://api.github.com/user/following/{user_login}"
-    headers = _create_headers(token)
-    response: requests.Response = _fetch("DELETE", url, headers=headers)
-    response.raise_for_status()
-    return response.status_code == 204
-
-
-def get_user_followers(
-    page: int, token: str, per_page: int = PER_PAGE_MAX
-) -> List[User]:
-    # https://docs.github.com/en/rest/users/followers#list-followers-of-the-authenticated-user
-    url = "https://api.github.com/user/followers"
-    params = {
-        "page": page,
-        "per_page": per_page,
-    }
-    headers = _create_headers(token)
-    response: requests.Response = _fetch("GET", url, headers=headers, params=params)
-    response.raise_for_status()
-    data = response.json()
-    return [User(**user) for user in data]
-
-
-def get_user_following(
-    page: int, token: str, per_page: int = PER_PAGE_MAX
-) -> List[User]:
-    # https://docs.github.com/en/rest/users/followers#list-the-people-the-authenticated-user-follows
-    url = "https://api.github.com/user/following"
-    params = {
-        "page": page,
-        "per_page": per_page,
-    }
-    headers = _create_headers(token)
-    response: requests.Response = _fetch("GET", url, headers=headers, params=params)
-    response.raise_for_status()
-    data = response.json()
-    return [User(**user) for user in data]
-
-
-def get_user(user_login: int, token: str) -> GithubUser:
-    # https://docs.github.com/en/rest/users/users#get-a-user
-    url = f"https://api.github.com/users/{user_login}"
-    headers = _create_headers(token)
-    response: requests.Response = _fetch("GET", url, headers=headers)
-    response.raise_for_status()
-    data = response.json()
-    return GithubUser(**data)
+class Token:
+    """
+    A GitHub token with its own connection pool and rate limit buckets.
+    """
+
+    def __init__(self, token: str, name: str, settings: GithubSettings):
+        self.name = name
+        self.settings = settings
+
+        # https://docs.github.com/en/rest/using-the-rest-api/rate-limits-for-the-rest-api
+        # https://docs.github.com/en/graphql/overview/rate-limits-and-node-limits-for-the-graphql-api
+        # https://docs.github.com/en/rest/search/search#rate-limit
+        self.rate_keepers: Dict[str, RateKeeper] = {
+            "core": RateKeeper(limit=5000, period=3600, clock=timestamp_clock),
+            "graphql": RateKeeper(limit=5000, period=3600, clock=timestamp_clock),
+            "search": RateKeeper(limit=30, period=60, clock=timestamp_clock),
+        }
+        # only the pacing runs under the rate keeper lock, so that concurrent
+        # callers can have several requests in flight
+        self._paced_acquires = {
+            resource: rate_keeper.decorator(lambda: None)
+            for resource, rate_keeper in self.rate_keepers.items()
+        }
+
+        self.session = self._create_session(token)
+
+    def _create_session(self, token: str) -> requests.Session:
+        session = requests.Session()
+        session.headers.update(
+            {
+                "Accept": "application/vnd.github.v3+json",
+                "User-Agent": "Follower Bot",
+                "Authorization": f"token {token}",
+            }
+        )
+
+        retry = Retry(
+            total=self.settings.max_retries,
+            backoff_factor=self.settings.backoff_factor,
+            status_forcelist=[500, 502, 503, 504],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.settings.pool_connections,
+            pool_maxsize=self.settings.pool_maxsize,
+            max_retries=retry,
+        )
+        session.mount("https://", adapter)
+        return session
+
+    def acquire(self, resource: str) -> None:
+        """
+        Wait for a request slot. While more than `pace_below` of the limit is
+        left requests go out at once, so concurrent callers burst, below it
+        they are spread evenly over the rest of the window. The pacing sleeps
+        under the rate keeper lock, which serializes the callers of a token.
+        """
+        rate_keeper = self.rate_keepers[resource]
+        if available(rate_keeper) > rate_keeper.limit * self.settings.pace_below:
+            # the used count is synced from the response headers
+            return
+        self._paced_acquires[resource]()
+
+    def available(self, resource: str) -> int:
+        return available(self.rate_keepers[resource])
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class Github:
+    def __init__(
+        self,
+        token: str,
+        settings: GithubSettings,
+        store: Optional[Store] = None,
+        read_tokens: Optional[List[str]] = None,
+    ):
+        self.settings = settings
+        self.cache = ResponseCache(max_size=settings.cache_size, store=store)
+
+        # the owner token acts as the authenticated user (`/user/...` and
+        # follow/unfollow), read requests go to the token with the most budget
+        self.owner = Token(token, name="owner", settings=settings)
+        self.tokens: List[Token] = [self.owner] + [
+            Token(read_token, name=f"read-{i}", settings=settings)
+            for i, read_token in enumerate(read_tokens or [], start=1)
+        ]
+        # writes all go through the owner token
+        self.write_pacer = WritePacer(
+            max_rate=settings.write_rate_max,
+            min_rate=settings.write_rate_min,
+            step=settings.write_rate_step,
+        )
+
+    @property
+    def rate_keepers(self) -> Dict[str, List[RateKeeper]]:
+        return {
+            resource: [token.rate_keepers[resource] for token in self.tokens]
+            for resource in self.owner.rate_keepers
+        }
+
+    @property
+    def rate_keeper(self) -> RateKeeper:
+        return self.owner.rate_keepers["core"]
+
+    def close(self) -> None:
+        self.cache.close()
+        for token in self.tokens:
+            token.close()
+
+    def _select_token(self, resource: str, owner: bool) -> Token:
+        if owner or len(self.tokens) == 1:
+            return self.owner
+        # on a tie spare the owner token, which also carries the writes
+        return max(
+            self.tokens,
+            key=lambda token: (token.available(resource), token is not self.owner),
+        )
+
+    def _fetch(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict] = None,
+        headers: Optional[Dict] = None,
+        json: Optional[Dict] = None,
+        resource: str = "core",
+        owner: bool = False,
+    ) -> requests.Response:
+        """
+        Send a request with the owner token if `owner`, otherwise with the
+        token that has the most budget. Rate limited responses are retried
+        after the wait GitHub asks for, and writes are paced.
+        """
+        write = method in WRITE_METHODS and resource != "graphql"
+        retries = self.settings.rate_limit_retries
+
+        for attempt in range(retries + 1):
+            check_quota(resource)
+            token = self._select_token(resource, owner or write)
+            if write:
+                self.write_pacer.wait()
+            token.acquire(resource)
+            response = self._request(
+                token,
+                method,
+                url,
+                params=params,
+                headers=headers,
+                json=json,
+                resource=resource,
+            )
+
+            wait = self._rate_limit_wait(response, attempt)
+            if wait is None:
+                # conditional requests answered with 304 are free
+                if response.status_code != 304:
+                    consume_quota(resource)
+                if write:
+                    self.write_pacer.success()
+                return response
+
+            if write:
+                self.write_pacer.throttled()
+            primary = response.headers.get("x-ratelimit-remaining") == "0"
+            if primary and not (owner or write) and len(self.tokens) > 1:
+                # another token with budget can take this read right away, a
+                # secondary limit is always waited out
+                other = self._select_token(resource, False)
+                if other is not token and other.available(resource):
+                    wait = 0
+            if attempt == retries or wait > self.settings.rate_limit_max_wait:
+                logger.error(f"Rate limited ({token.name}, {resource}): {url}")
+                return response
+
+            logger.warning(
+                f"Rate limited ({token.name}, {resource}), retry in {wait:.0f} seconds"
+            )
+            time.sleep(wait)
+
+        return response
+
+    def _rate_limit_wait(
+        self, response: requests.Response, attempt: int
+    ) -> Optional[float]:
+        """
+        Seconds to wait before retrying a rate limited response, None if the
+        response is not rate limited.
+        """
+        # https://docs.github.com/en/rest/using-the-rest-api/rate-limits-for-the-rest-api#exceeding-the-rate-limit
+        if response.status_code not in (403, 429):
+            return None
+
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass
+            try:
+                retry_date = parsedate_to_datetime(retry_after)
+                return max(0.0, retry_date.timestamp() - timestamp_clock())
+            except (TypeError, ValueError):
+                logger.warning(f"Invalid Retry-After header: {retry_after}")
+
+        reset = response.headers.get("x-ratelimit-reset")
+        if response.headers.get("x-ratelimit-remaining") == "0" and reset is not None:
+            return max(0.0, float(reset) - timestamp_clock()) + 1
+
+        try:
+            message = str(response.json().get("message", ""))
+        except (ValueError, AttributeError):
+            message = ""
+        if "secondary rate limit" in message.lower():
+            # no hint from the headers, back off exponentially
+            return SECONDARY_RATE_LIMIT_WAIT * 2**attempt
+
+        return None
+
+    def _request(
+        self,
+        token: Token,
+        method: str,
+        url: str,
+        params: Optional[Dict] = None,
+        headers: Optional[Dict] = None,
+        json: Optional[Dict] = None,
+        resource: str = "core",
+    ) -> requests.Response:
+        rate_keeper = token.rate_keepers[resource]
+        logger.debug(f"Delay for {rate_keeper.delay_time:.2f} seconds")
+        response = token.session.request(
+            method,
+            url,
+            params=params,
+            headers=headers,
+            json=json,
+            timeout=(self.settings.connect_timeout, self.settings.read_timeout),
+        )
+
+        headers_map = {
+            "x-ratelimit-limit": lambda x: setattr(rate_keeper, "limit", int(x)),
+            "x-ratelimit-used": lambda x: setattr(rate_keeper, "used", int(x)),
+            "x-ratelimit-reset": lambda x: setattr(rate_keeper, "reset", float(x)),
+        }
+
+        for key, value in response.headers.items():
+            lower_key = key.lower()
+            if lower_key in headers_map:
+                headers_map[lower_key](value)
+
+        logger.debug(f"Recommended delay : {rate_keeper.recommend_delay:.2f} seconds")
+        logger.debug(f"Rate Keeper ({token.name}, {resource}): {rate_keeper}")
+        return response
+
+    def _get_json(
+        self,
+        url: str,
+        params: Optional[Dict] = None,
+        resource: str = "core",
+        owner: bool = False,
+        cache: bool = True,
+    ) -> Any:
+        data, _ = self._get_json_page(
+            url, params, resource=resource, owner=owner, cache=cache
+        )
+        return data
+
+    def _get_json_page(
+        self,
+        url: str,
+        params: Optional[Dict] = None,
+        resource: str = "core",
+        owner: bool = False,
+        cache: bool = True,
+    ) -> Tuple[Any, str]:
+        """
+        Return the parsed body and the `Link` header of the response. With
+        `cache` off the response is neither revalidated nor cached, for
+        cursor-paged listings whose pages are read once.
+        """
+        # https://docs.github.com/en/rest/using-the-rest-api/best-practices-for-using-the-rest-api#use-conditional-requests-if-appropriate
+        key = cache_key(url, params)
+        entry = self.cache.get(key) if cache else None
+        if entry is not None and entry.link is None:
+            # cached before the Link header was kept, refresh it once
+            entry = None
+
+        headers = {}
+        if entry is not None:
+            if entry.etag is not None:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified is not None:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        response = self._fetch(
+            "GET", url, params=params, headers=headers, resource=resource, owner=owner
+        )
+        if response.status_code == 304 and entry is not None:
+            logger.debug(f"Not modified: {url} {params}")
+            return entry.data, entry.link
+
+        response.raise_for_status()
+        data = response.json()
+        # empty if the response has no Link header (single or last page)
+        link = response.headers.get("Link", "")
+
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if cache and (etag is not None or last_modified is not None):
+            self.cache.put(
+                key,
+                CacheEntry(
+                    etag=etag, last_modified=last_modified, link=link, data=data
+                ),
+            )
+        return data, link
+
+    def _iter_pages(
+        self,
+        url: str,
+        params: Dict,
+        cursor: str,
+        owner: bool = False,
+        cache: bool = True,
+    ) -> Iterator[Page]:
+        # https://docs.github.com/en/rest/using-the-rest-api/using-pagination-in-the-rest-api
+        while True:
+            data, link = self._get_json_page(
+                url, params=params, owner=owner, cache=cache
+            )
+            next_cursor = next_link_cursor(link, cursor)
+            yield Page(users=[User(**user) for user in data], next=next_cursor)
+            if next_cursor is None:
+                return
+            params = {**params, cursor: next_cursor}
+
+    def _fan_out_pages(
+        self, url: str, page: int, total: int, per_page: int, workers: int
+    ) -> Iterator[Page]:
+        """
+        Fetch the pages from `page` up to the one holding item `total` with
+        at most `workers` requests in flight, yielding them in order. Pages
+        beyond `total` (the list grew meanwhile) are walked by the Link header.
+        """
+        last_page = max(page, math.ceil(total / per_page))
+        pages = range(page, last_page + 1)
+
+        def fetch(page: int) -> Tuple[Any, str]:
+            params = {"page": page, "per_page": per_page}
+            return self._get_json_page(url, params=params, owner=True)
+
+        results = bounded_map(fetch, pages, workers)
+        try:
+            for page, (data, link) in zip(pages, results):
+                users = [User(**user) for user in data]
+                if page < last_page:
+                    yield Page(users=users, next=page + 1)
+                    continue
+
+                next_page = next_link_cursor(link, "page")
+                yield Page(users=users, next=next_page)
+                if next_page is not None:
+                    params = {"page": next_page, "per_page": per_page}
+                    yield from self._iter_pages(url, params, "page", owner=True)
+        finally:
+            results.close()
+
+    def _get_etag(
+        self, url: str, params: Optional[Dict] = None, owner: bool = False
+    ) -> Optional[str]:
+        # a conditional request, the response is cached for the next read
+        self._get_json_page(url, params=params, owner=owner)
+        entry = self.cache.get(cache_key(url, params))
+        return None if entry is None else entry.etag
+
+    def get_followers_etag(self, per_page: int = PER_PAGE_MAX) -> Optional[str]:
+        """
+        ETag of the first followers page, the newest followers come first.
+        """
+        url = f"{API_URL}/user/followers"
+        return self._get_etag(url, {"page": 1, "per_page": per_page}, owner=True)
+
+    def get_following_etag(self, per_page: int = PER_PAGE_MAX) -> Optional[str]:
+        """
+        ETag of the first following page, the latest follows come first.
+        """
+        url = f"{API_URL}/user/following"
+        return self._get_etag(url, {"page": 1, "per_page": per_page}, owner=True)
+
+    def get_authenticated_user(self) -> GithubUser:
+        # https://docs.github.com/en/rest/users/users#get-the-authenticated-user
+        url = f"{API_URL}/user"
+        data = self._get_json(url, owner=True)
+        return GithubUser(**data)
+
+    def iter_users(
+        self, since: int = 0, per_page: int = PER_PAGE_MAX
+    ) -> Iterator[Page]:
+        """
+        Stream all users in sign-up order page by page, `Page.next` is the
+        `since` of the next page.
+        """
+        # https://docs.github.com/en/rest/users/users#list-users
+        url = f"{API_URL}/users"
+        # the cursor only moves forward, a page is not read again
+        params = {"since": since, "per_page": per_page}
+        return self._iter_pages(url, params, "since", cache=False)
+
+    def iter_followers(
+        self,
+        page: int = 1,
+        per_page: int = PER_PAGE_MAX,
+        workers: int = 1,
+        total: Optional[int] = None,
+    ) -> Iterator[Page]:
+        """
+        Stream the followers of the authenticated user page by page,
+        `Page.next` is the number of the next page. With several `workers`
+        the page range is read from the follower count (`total`, or the
+        one of the authenticated user) and fetched concurrently.
+        """
+        # https://docs.github.com/en/rest/users/followers#list-followers-of-the-authenticated-user
+        url = f"{API_URL}/user/followers"
+        if workers > 1:
+            if total is None:
+                total = self.get_authenticated_user().followers
+            return self._fan_out_pages(url, page, total, per_page, workers)
+        params = {"page": page, "per_page": per_page}
+        return self._iter_pages(url, params, "page", owner=True)
+
+    def iter_following(
+        self,
+        page: int = 1,
+        per_page: int = PER_PAGE_MAX,
+        workers: int = 1,
+        total: Optional[int] = None,
+    ) -> Iterator[Page]:
+        """
+        Stream the users the authenticated user follows page by page,
+        `Page.next` is the number of the next page. With several `workers`
+        the page range is read from the following count (`total`, or the
+        one of the authenticated user) and fetched concurrently.
+        """
+        # https://docs.github.com/en/rest/users/followers#list-the-people-the-authenticated-user-follows
+        url = f"{API_URL}/user/following"
+        if workers > 1:
+            if total is None:
+                total = self.get_authenticated_user().following
+            return self._fan_out_pages(url, page, total, per_page, workers)
+        params = {"page": page, "per_page": per_page}
+        return self._iter_pages(url, params, "page", owner=True)
+
+    def search_users(
+        self, query: str, page: int, per_page: int = PER_PAGE_MAX
+    ) -> List[User]:
+        # https://docs.github.com/en/rest/search/search#search-users
+        url = f"{API_URL}/search/users"
+        params = {
+            "q": query,
+            "sort": "joined",
+            "order": "asc",
+            "page": page,
+            "per_page": per_page,
+        }
+        # the query cursor moves forward, a page is not read again
+        data = self._get_json(url, params=params, resource="search", cache=False)
+        return [User(**user) for user in data["items"]]
+
+    def put_user_following(self, user_login: str) -> bool:
+        # https://docs.github.com/en/rest/users/followers#follow-a-user
+        url = f"{API_URL}/user/following/{user_login}"
+        response = self._fetch("PUT", url, owner=True)
+        response.raise_for_status()
+        return response.status_code == 204
+
+    def delete_user_following(self, user_login: str) -> bool:
+        # https://docs.github.com/en/rest/users/followers#unfollow-a-user
+        url = f"{API_URL}/user/following/{user_login}"
+        response = self._fetch("DELETE", url, owner=True)
+        response.raise_for_status()
+        return response.status_code == 204
+
+    def get_user(self, user_login: str) -> GithubUser:
+        # https://docs.github.com/en/rest/users/users#get-a-user
+        url = f"{API_URL}/users/{user_login}"
+        data = self._get_json(url)
+        return GithubUser(**data)
+
+    def get_github_users(self, user_logins: List[str]) -> Dict[str, GithubUser]:
+        """
+        Batch fetch user profiles through the GraphQL API, keyed by the
+        requested login. Logins that cannot be resolved (organizations,
+        renamed users, failed batches) are left out.
+        """
+        batch_size = self.settings.graphql_batch_size
+        if batch_size <= 0:
+            return {}
+
+        users: Dict[str, GithubUser] = {}
+        for i in range(0, len(user_logins), batch_size):
+            batch = user_logins[i : i + batch_size]
+            try:
+                users.update(self._get_github_users_batch(batch))
+            except (RequestException, ValueError) as e:
+                logger.warning(f"GraphQL user lookup failed, fallback to REST: {e}")
+        return users
+
+    def _get_github_users_batch(self, user_logins: List[str]) -> Dict[str, GithubUser]:
+        # https://docs.github.com/en/graphql/reference/queries#user
+        variables = {f"l{i}": login for i, login in enumerate(user_logins)}
+        definitions = ", ".join(f"${name}: String!" for name in variables)
+        nodes = "\n".join(
+            f"u{i}: user(login: $l{i}) {{{GRAPHQL_USER_FIELDS}}}"
+            for i in range(len(user_logins))
+        )
+        query = f"query({definitions}) {{\n{nodes}\n}}"
+
+        response = self._fetch(
+            "POST",
+            GRAPHQL_URL,
+            json={"query": query, "variables": variables},
+            resource="graphql",
+        )
+        response.raise_for_status()
+        body = response.json()
+
+        data = body.get("data")
+        if data is None:
+            raise ValueError(f"GraphQL errors: {body.get('errors')}")
+
+        users: Dict[str, GithubUser] = {}
+        for i, login in enumerate(user_logins):
+            node = data.get(f"u{i}")
+            if node is None or node.get("databaseId") is None:
+                continue
+            users[login] = GithubUser(
+                id=node["databaseId"],
+                login=node["login"],
+                # GraphQL returns empty strings where REST returns null
+                name=node["name"] or None,
+                company=node["company"] or None,
+                location=node["location"] or None,
+                email=node["email"] or None,
+                public_repos=node["repositories"]["totalCount"],
+                public_gists=node["gists"]["totalCount"],
+                followers=node["followers"]["totalCount"],
+                following=node["following"]["totalCount"],
+                updated_at=node["updatedAt"],
+                created_at=node["createdAt"],
+            )
+        return users
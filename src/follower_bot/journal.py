@@ -0,0 +1,40 @@
+import threading
+from contextvars import ContextVar
+from datetime import datetime
+from typing import List, Optional
+
+from .model import CreateBy, Event, EventKind
+
+
+class Journal:
+    """
+    Follow and unfollow events of a single bot run, written in bulk when
+    the run ends.
+    """
+
+    def __init__(self, create_by: CreateBy):
+        self.create_by = create_by
+        self.events: List[Event] = []
+        self._lock = threading.Lock()
+
+    def record(self, user_id: int, kind: EventKind) -> None:
+        event = Event(
+            user_id=user_id,
+            kind=kind,
+            create_by=self.create_by,
+            date=datetime.now(),
+        )
+        with self._lock:
+            self.events.append(event)
+
+
+# journal of the bot run in the current context, transitions outside a run are not recorded
+current_journal: ContextVar[Optional[Journal]] = ContextVar(
+    "current_journal", default=None
+)
+
+
+def record_event(user_id: int, kind: EventKind) -> None:
+    journal = current_journal.get()
+    if journal is not None:
+        journal.record(user_id, kind)
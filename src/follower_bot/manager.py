@@ -15,8 +15,10 @@ from loguru import logger
 from pydantic import RootModel, create_model
 
 from .bots import Bot, BotSettings
+from .budget import BudgetAllocator
 from .email import BotError, Email
 from .file import read_file, write_file
+from .github import Github
 from .settings import Settings
 from .store import Store
 
@@ -24,9 +26,16 @@ BOTS_SCHEMA_FILE = ".vscode/bots-schema.json"
 
 
 class Manager:
-    def __init__(self, settings: Settings, store: Store, email: Optional[Email] = None):
+    def __init__(
+        self,
+        settings: Settings,
+        store: Store,
+        github: Github,
+        email: Optional[Email] = None,
+    ):
         self.settings = settings
         self.store = store
+        self.github = github
         self.email = email
 
         self._scheduler = BackgroundScheduler()
@@ -42,6 +51,15 @@ class Manager:
         self._bots: List[Bot] = []
         self._bots_settings: List[BotSettings] = []
         self._read_bots_settings()
+        self.budget = BudgetAllocator(
+            rate_keepers=self.github.rate_keepers,
+            reserve=self.settings.github.budget_reserve,
+            priorities={
+                settings.name: settings.priority
+                for settings in self._bots_settings
+                if settings.enabled and not settings.critical
+            },
+        )
         self._register_bots()
 
     def _scan_classes(self) -> None:
@@ -89,8 +107,10 @@ class Manager:
                 settings=bot_settings_class(**settings.model_dump()),
                 g_settings=self.settings,
                 store=self.store,
+                github=self.github,
                 email=self.email,
                 scheduler=self._scheduler,
+                budget=self.budget,
             )
             self._bots.append(bot)
 
@@ -164,4 +184,5 @@ class Manager:
         self._scheduler.shutdown()
 
     def close(self) -> None:
+        self.github.close()
         self.store.close()
@@ -1,8 +1,8 @@
-from datetime import datetime
+from datetime import date, datetime, timezone
 from enum import IntEnum
-from typing import Optional
+from typing import NamedTuple, Optional
 
-from sqlmodel import Field, SQLModel
+from sqlmodel import Field, Index, SQLModel
 
 
 class User(SQLModel):
@@ -19,7 +19,7 @@ class GithubUser(User):
     public_gists: int = Field(description="Number of public gists")
     followers: int = Field(description="Number of followers")
     following: int = Field(description="Number of following")
-    # created_at: datetime = Field(description="Date of creation")
+    created_at: Optional[datetime] = Field(default=None, description="Date of creation")
     updated_at: datetime = Field(description="Date of last update")
 
     @property
@@ -35,7 +35,65 @@ class GithubUser(User):
         return self.updated_at
 
 
+class CachedGithubUser(GithubUser, table=True):
+    __table_args__ = (
+        # delete_cached_github_users
+        Index("ix_cachedgithubuser_fetch_date", "fetch_date"),
+    )
+
+    # logins are reused after renames, the cache is keyed by id only
+    login: str = Field(description="User login")
+    fetch_date: datetime = Field(
+        default_factory=datetime.now, description="Date of fetch"
+    )
+
+
+def _to_utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _from_utc_naive(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+
+def github_user2cached(github_user: GithubUser) -> CachedGithubUser:
+    # GitHub timestamps are UTC, they are stored without timezone
+    return CachedGithubUser(
+        **github_user.model_dump(exclude={"created_at", "updated_at"}),
+        created_at=_to_utc_naive(github_user.created_at),
+        updated_at=_to_utc_naive(github_user.updated_at),
+    )
+
+
+def cached2github_user(cached: CachedGithubUser) -> GithubUser:
+    return GithubUser(
+        **cached.model_dump(exclude={"created_at", "updated_at", "fetch_date"}),
+        created_at=_from_utc_naive(cached.created_at),
+        updated_at=_from_utc_naive(cached.updated_at),
+    )
+
+
+class RejectedUser(SQLModel, table=True):
+    __table_args__ = (
+        # delete_rejected_users
+        Index("ix_rejecteduser_recheck_date", "recheck_date"),
+    )
+
+    id: int = Field(description="User ID", primary_key=True)
+    expr_hash: str = Field(description="Hash of the filter expression")
+    recheck_date: datetime = Field(description="Date after which to check again")
+
+
 class Follower(User, table=True):
+    __table_args__ = (
+        # query_not_following_followers, query_unfollow_followers, query_follower_count
+        Index("ix_follower_followed_unfollow_count", "followed", "unfollow_count"),
+    )
+
     follow_date: datetime = Field(
         default_factory=datetime.now, description="Date of follow"
     )
@@ -70,9 +128,15 @@ class CreateBy(IntEnum):
     UNFOLLOW_FOLLOWING = 64
 
     MAIL_STATS = 128
+    MAINTENANCE = 256
 
 
 class Following(User, table=True):
+    __table_args__ = (
+        # query_unfollow_followers, query_following_count
+        Index("ix_following_followed_create_by", "followed", "create_by"),
+    )
+
     create_by: CreateBy = Field(description="Who created the following")
     follow_date: datetime = Field(
         default_factory=datetime.now, description="Date of follow"
@@ -108,11 +172,38 @@ class State(SQLModel, table=True):
         default=None, description="Sync follower ID"
     )
     sync_follower_page: int = Field(default=1, description="Sync follower page")
+    sync_follower_count: Optional[int] = Field(
+        default=None, description="Follower count of the last completed sync"
+    )
+    sync_follower_etag: Optional[str] = Field(
+        default=None, description="First follower page ETag of the last completed sync"
+    )
+    sync_follower_date: Optional[datetime] = Field(
+        default=None, description="Start date of the last completed full follower sync"
+    )
     sync_following_id: Optional[int] = Field(
         default=None, description="Sync following ID"
     )
     sync_following_page: int = Field(default=1, description="Sync following page")
+    sync_following_count: Optional[int] = Field(
+        default=None, description="Following count of the last completed sync"
+    )
+    sync_following_etag: Optional[str] = Field(
+        default=None, description="First following page ETag of the last completed sync"
+    )
+    sync_following_date: Optional[datetime] = Field(
+        default=None, description="Start date of the last completed full following sync"
+    )
     follow_user_since: int = Field(default=0, description="Follow user search since")
+    follow_user_search_query: Optional[str] = Field(
+        default=None, description="Follow user search query of the cursor"
+    )
+    follow_user_search_created: Optional[datetime] = Field(
+        default=None, description="Follow user search joined date cursor"
+    )
+    follow_user_search_page: int = Field(
+        default=1, description="Follow user search page"
+    )
     unfollow_following_since: int = Field(
         default=0, description="Unfollow following since"
     )
@@ -126,7 +217,7 @@ class HistoryState(IntEnum):
     FAIL = 2
 
 
-class History(SQLModel, table=True):
+class HistoryBase(SQLModel):
     id: Optional[int] = Field(description="History ID", primary_key=True)
     create_by: CreateBy = Field(description="Who created the history")
     start_date: datetime = Field(
@@ -138,3 +229,85 @@ class History(SQLModel, table=True):
     state: HistoryState = Field(description="State of history")
     message: Optional[str] = Field(default=None, description="Message of history")
     count: int = Field(default=0, description="Count of history")
+
+
+class History(HistoryBase, table=True):
+    __table_args__ = (
+        # aggregate_histories, prune_histories
+        Index("ix_history_start_date_end_date", "start_date", "end_date"),
+    )
+
+
+class HistoryArchive(HistoryBase, table=True):
+    pass
+
+
+class HistoryDaily(SQLModel, table=True):
+    day: date = Field(description="Start day of the runs", primary_key=True)
+    create_by: CreateBy = Field(
+        description="Who created the histories", primary_key=True
+    )
+    state: HistoryState = Field(description="State of the histories", primary_key=True)
+    runs: int = Field(default=0, description="Number of runs")
+    count: int = Field(default=0, description="Sum of the history counts")
+
+
+class HistoryAggregate(NamedTuple):
+    # day of the runs when aggregated by day, otherwise None
+    day: Optional[date]
+    create_by: CreateBy
+    state: HistoryState
+    runs: int
+    count: int
+
+
+class EventKind(IntEnum):
+    FOLLOWER_GAINED = 1
+    FOLLOWER_LOST = 2
+    FOLLOWING_ADDED = 3
+    FOLLOWING_REMOVED = 4
+
+
+class Event(SQLModel, table=True):
+    __table_args__ = (
+        # compact_events
+        Index("ix_event_date", "date"),
+        Index("ix_event_user_id_date", "user_id", "date"),
+    )
+
+    id: Optional[int] = Field(default=None, description="Event ID", primary_key=True)
+    user_id: int = Field(description="User ID")
+    kind: EventKind = Field(description="Kind of event")
+    create_by: CreateBy = Field(description="Who caused the event")
+    date: datetime = Field(default_factory=datetime.now, description="Date of event")
+
+
+class EventSummary(SQLModel, table=True):
+    user_id: int = Field(description="User ID", primary_key=True)
+    kind: EventKind = Field(description="Kind of event", primary_key=True)
+    count: int = Field(default=0, description="Number of compacted events")
+    first_date: datetime = Field(description="Date of the first compacted event")
+    last_date: datetime = Field(description="Date of the last compacted event")
+
+
+class Counter(SQLModel, table=True):
+    day: date = Field(description="Day of the bucket", primary_key=True)
+    name: str = Field(description="Counter name", primary_key=True)
+    value: int = Field(default=0, description="Change of the counter during the day")
+
+
+FOLLOWER_COUNTER = "follower"
+FOLLOWING_COUNTER = "following"
+
+
+class CachedResponse(SQLModel, table=True):
+    key: str = Field(description="Cache key of the request", primary_key=True)
+    etag: Optional[str] = Field(default=None, description="ETag of the response")
+    last_modified: Optional[str] = Field(
+        default=None, description="Last-Modified of the response"
+    )
+    link: Optional[str] = Field(default=None, description="Link header of the response")
+    body: str = Field(description="JSON body of the response")
+    access_date: datetime = Field(
+        default_factory=datetime.now, description="Date of last access"
+    )
@@ -0,0 +1,50 @@
+import threading
+import time
+from typing import Callable
+
+from loguru import logger
+
+
+class WritePacer:
+    """
+    Space write requests with additive increase, multiplicative decrease
+    (AIMD): every successful write raises the rate by `step`, a secondary
+    rate limit halves it. The rate stays within `[min_rate, max_rate]`
+    requests per second.
+    """
+
+    def __init__(
+        self,
+        max_rate: float,
+        min_rate: float,
+        step: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.step = step
+        self.clock = clock
+        self.rate = max_rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        # writes are serialized, the lock is held while waiting for the slot
+        with self._lock:
+            now = self.clock()
+            delay = self._next - now
+            if delay > 0:
+                time.sleep(delay)
+                now += delay
+            self._next = now + 1 / self.rate
+
+    def success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.step)
+
+    def throttled(self) -> None:
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            # the next write waits for the slower pace as well
+            self._next = max(self._next, self.clock() + 1 / self.rate)
+            logger.info(f"Write rate lowered to {self.rate:.3f} requests/second")
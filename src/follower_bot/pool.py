@@ -0,0 +1,36 @@
+import contextvars
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def bounded_map(
+    func: Callable[[T], R], items: Iterable[T], workers: int
+) -> Iterator[R]:
+    """
+    Lazily map `func` over `items` with at most `workers` calls in flight,
+    yielding results in input order. Calls run in a copy of the caller's
+    context, so context variables (e.g. the bot quota) are visible to them.
+    """
+    if workers <= 1:
+        yield from map(func, items)
+        return
+
+    futures: Deque[Future] = deque()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for item in items:
+            context = contextvars.copy_context()
+            futures.append(executor.submit(context.run, func, item))
+            if len(futures) >= workers:
+                yield futures.popleft().result()
+
+        while futures:
+            yield futures.popleft().result()
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
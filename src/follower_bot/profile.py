@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Set, Tuple, TypeVar
+
+from loguru import logger
+from requests.exceptions import RequestException
+from sqlmodel import Session
+
+from .github import Github
+from .model import GithubUser, User, cached2github_user, github_user2cached
+from .pool import bounded_map
+from .settings import ProfileCacheSettings
+from .store import Store
+
+U = TypeVar("U", bound=User)
+
+
+class ProfileResolver:
+    """
+    Resolve user profiles from the profile cache first, then through
+    GraphQL batches, then the REST API. Fetched profiles are written back
+    to the cache.
+    """
+
+    def __init__(self, github: Github, store: Store, settings: ProfileCacheSettings):
+        self.github = github
+        self.store = store
+        self.settings = settings
+
+    def max_age(self, keys: Set[str]) -> timedelta:
+        """
+        A cached profile can decide the filter if every key it reads is
+        still fresh, so the shortest TTL of the keys applies.
+        """
+        ttls = [self.settings.field_ttl.get(key, self.settings.ttl) for key in keys]
+        return timedelta(hours=min(ttls, default=self.settings.ttl))
+
+    def _retention(self) -> timedelta:
+        ttls = [self.settings.ttl, *self.settings.field_ttl.values()]
+        return timedelta(hours=max(ttls))
+
+    def resolve(
+        self, users: List[U], keys: Set[str], session: Session, workers: int = 1
+    ) -> Iterator[Tuple[U, Optional[GithubUser], Optional[RequestException]]]:
+        """
+        Yield `(user, profile, error)` in input order, `keys` are the filter
+        keys the profiles are needed for. REST lookups run with at most
+        `workers` requests in flight.
+        """
+        # read ids and logins up front, ORM instances must not be touched by workers
+        user_ids = [user.id for user in users]
+        user_logins = [user.login for user in users]
+
+        cached = {}
+        max_age = self.max_age(keys)
+        if users and max_age > timedelta(0):
+            cached = {
+                row.id: cached2github_user(row)
+                for row in self.store.query_cached_github_users(
+                    ids=user_ids, since=datetime.now() - max_age, session=session
+                )
+            }
+            logger.debug(f"Profile cache hits: {len(cached)}/{len(users)}")
+
+        missing = [
+            login
+            for user_id, login in zip(user_ids, user_logins)
+            if user_id not in cached
+        ]
+        profiles = self.github.get_github_users(missing)
+        self._save(list(profiles.values()), session)
+        if self.settings.ttl > 0:
+            self.store.delete_cached_github_users(
+                before=datetime.now() - self._retention(), session=session
+            )
+
+        def lookup(item: Tuple[U, int, str]):
+            user, user_id, user_login = item
+            github_user = cached.get(user_id) or profiles.get(user_login)
+            if github_user is not None:
+                return user, github_user, None, False
+            try:
+                return user, self.github.get_user(user_login=user_login), None, True
+            except RequestException as e:
+                return user, None, e, False
+
+        results = bounded_map(lookup, zip(users, user_ids, user_logins), workers)
+        for user, github_user, error, fetched in results:
+            if fetched:
+                self._save([github_user], session)
+            yield user, github_user, error
+
+    def _save(self, github_users: List[GithubUser], session: Session) -> None:
+        if self.settings.ttl <= 0 or not github_users:
+            return
+        self.store.upsert_cached_github_users(
+            [github_user2cached(github_user) for github_user in github_users],
+            session=session,
+        )
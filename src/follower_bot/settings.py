@@ -1,6 +1,6 @@
 import os
 import sys
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field, ValidationError, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -15,6 +15,128 @@ class DatabaseSettings(BaseModel):
     log_level: Optional[str] = Field(
         default=None, description="Log level for the database"
     )
+    sqlite_journal_mode: Literal[
+        "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"
+    ] = Field(default="WAL", description="SQLite journal mode")
+    sqlite_synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = Field(
+        default="NORMAL", description="SQLite synchronous level"
+    )
+    sqlite_cache_size: int = Field(
+        default=-64000,
+        description="SQLite page cache size (pages, or KiB if negative)",
+    )
+    sqlite_mmap_size: int = Field(
+        default=268435456, ge=0, description="SQLite memory-mapped I/O size in bytes"
+    )
+    sqlite_busy_timeout: int = Field(
+        default=5000,
+        ge=0,
+        description="SQLite busy timeout in milliseconds when the database is locked",
+    )
+    pool_size: int = Field(
+        default=5, ge=1, description="Connection pool size (server databases)"
+    )
+    max_overflow: int = Field(
+        default=10,
+        ge=0,
+        description="Connections allowed beyond the pool size (server databases)",
+    )
+    pool_recycle: int = Field(
+        default=3600,
+        description="Seconds after which a connection is recycled, -1 to disable (server databases)",
+    )
+
+
+class GithubSettings(BaseModel):
+    """
+    Settings for the GitHub API client.
+    """
+
+    pool_connections: int = Field(
+        default=10, ge=1, description="Number of connection pools to cache"
+    )
+    pool_maxsize: int = Field(
+        default=10, ge=1, description="Maximum number of connections in each pool"
+    )
+    connect_timeout: float = Field(
+        default=10, gt=0, description="Connect timeout in seconds"
+    )
+    read_timeout: float = Field(default=30, gt=0, description="Read timeout in seconds")
+    max_retries: int = Field(
+        default=3, ge=0, description="Maximum number of retries for server errors"
+    )
+    backoff_factor: float = Field(
+        default=0.5, ge=0, description="Backoff factor between retries"
+    )
+    graphql_batch_size: int = Field(
+        default=100,
+        ge=0,
+        le=100,
+        description="Number of user profiles fetched per GraphQL request (0 to disable)",
+    )
+    cache_size: int = Field(
+        default=1000,
+        ge=0,
+        description="Maximum number of cached responses for conditional requests, each holds a page of up to 100 users (0 to disable)",
+    )
+    rate_limit_retries: int = Field(
+        default=3,
+        ge=0,
+        description="Maximum number of retries after a primary or secondary rate limit response",
+    )
+    rate_limit_max_wait: float = Field(
+        default=900,
+        ge=0,
+        description="Longest wait in seconds before retrying a rate limited request, longer limits fail the request",
+    )
+    pace_below: float = Field(
+        default=0.5,
+        ge=0,
+        le=1,
+        description="Fraction of a rate limit left below which requests are spread over the rest of the window (1 to always pace), above it concurrent requests go out at once",
+    )
+    write_rate_max: float = Field(
+        default=1,
+        gt=0,
+        description="Maximum write (follow/unfollow) requests per second",
+    )
+    write_rate_min: float = Field(
+        default=1 / 60,
+        gt=0,
+        description="Minimum write requests per second after repeated secondary rate limits",
+    )
+    write_rate_step: float = Field(
+        default=0.05,
+        gt=0,
+        description="Write rate increase in requests per second after each successful write",
+    )
+    budget_reserve: float = Field(
+        default=0.2,
+        ge=0,
+        le=1,
+        description="Fraction of each rate limit reserved for critical bots",
+    )
+
+
+class ProfileCacheSettings(BaseModel):
+    """
+    Settings for the user profile cache.
+    """
+
+    ttl: int = Field(
+        default=24,
+        ge=0,
+        description="Hours a cached user profile stays fresh (0 to disable)",
+    )
+    field_ttl: Dict[str, int] = Field(
+        default_factory=lambda: {
+            "name": 168,
+            "company": 168,
+            "location": 168,
+            "email": 168,
+        },
+        description="Hours a cached profile stays fresh per filter key, overrides ttl",
+    )
 
 
 class EmailSettings(BaseModel):
@@ -71,6 +193,17 @@ class Settings(BaseSettings):
     )
 
     github_token: str = Field(description="GitHub token for authentication")
+    github_read_tokens: List[str] = Field(
+        default_factory=list,
+        description="Additional GitHub tokens that share read requests (profile lookups, discovery)",
+    )
+    github: GithubSettings = Field(
+        default_factory=GithubSettings, description="Settings for the GitHub API client"
+    )
+    profile_cache: ProfileCacheSettings = Field(
+        default_factory=ProfileCacheSettings,
+        description="Settings for the user profile cache",
+    )
     banner_file: Optional[str] = Field(
         default="banner.txt",
         description="Path to the banner file to display on the console",
@@ -1,23 +1,251 @@
 import logging
-from datetime import datetime
-from typing import List, Optional, Tuple
+import threading
+from array import array
+from datetime import date, datetime, timedelta
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 
-from sqlmodel import Session, SQLModel, create_engine, func, or_, select, update
+from loguru import logger
+from sqlalchemy import and_, case, event, inspect, text, true
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.engine import Engine, make_url
+from sqlmodel import (
+    Session,
+    SQLModel,
+    create_engine,
+    delete,
+    func,
+    or_,
+    select,
+    update,
+)
 
-from .model import CreateBy, Follower, Following, History, State
+from .journal import record_event
+from .model import (
+    FOLLOWER_COUNTER,
+    FOLLOWING_COUNTER,
+    CachedGithubUser,
+    CachedResponse,
+    Counter,
+    CreateBy,
+    Event,
+    EventKind,
+    EventSummary,
+    Follower,
+    Following,
+    History,
+    HistoryAggregate,
+    HistoryArchive,
+    HistoryDaily,
+    RejectedUser,
+    State,
+    User,
+)
+from .settings import DatabaseSettings
+
+
+def create_tuned_engine(settings: DatabaseSettings) -> Engine:
+    url = make_url(settings.url)
+    if url.get_backend_name() != "sqlite":
+        return create_engine(
+            url,
+            pool_size=settings.pool_size,
+            max_overflow=settings.max_overflow,
+            pool_recycle=settings.pool_recycle,
+            pool_pre_ping=True,
+        )
+
+    engine = create_engine(url)
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, _) -> None:
+        # https://www.sqlite.org/pragma.html
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {settings.sqlite_busy_timeout}")
+        cursor.execute(f"PRAGMA journal_mode = {settings.sqlite_journal_mode}")
+        cursor.execute(f"PRAGMA synchronous = {settings.sqlite_synchronous}")
+        cursor.execute(f"PRAGMA cache_size = {settings.sqlite_cache_size}")
+        cursor.execute(f"PRAGMA mmap_size = {settings.sqlite_mmap_size}")
+        cursor.close()
+
+    return engine
+
+
+# events recorded when a user starts and stops being followed, per model
+FOLLOW_EVENTS: Dict[Type[SQLModel], Tuple[EventKind, EventKind]] = {
+    Follower: (EventKind.FOLLOWER_GAINED, EventKind.FOLLOWER_LOST),
+    Following: (EventKind.FOLLOWING_ADDED, EventKind.FOLLOWING_REMOVED),
+}
+
+# dialects with `INSERT ... ON CONFLICT` style upserts
+UPSERT_DIALECTS = ("sqlite", "postgresql", "mysql")
+# bound parameter limit of older SQLite versions
+MAX_BOUND_PARAMETERS = 999
+
+# counters of the followed users per model, summed over all days
+FOLLOW_COUNTERS: Dict[Type[SQLModel], str] = {
+    Follower: FOLLOWER_COUNTER,
+    Following: FOLLOWING_COUNTER,
+}
+
+
+def chunked(values: List, parameters: int = 1) -> Iterator[List]:
+    """
+    Split `values` into chunks whose statements bind at most
+    `MAX_BOUND_PARAMETERS`, `parameters` per value.
+    """
+    chunk_size = max(1, MAX_BOUND_PARAMETERS // parameters)
+    for i in range(0, len(values), chunk_size):
+        yield values[i : i + chunk_size]
+
+
+def day_start(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+def history_daily(aggregate: HistoryAggregate) -> HistoryDaily:
+    return HistoryDaily(
+        day=aggregate.day,
+        create_by=aggregate.create_by,
+        state=aggregate.state,
+        runs=aggregate.runs,
+        count=aggregate.count,
+    )
 
 
 class Store:
-    def __init__(self, url: str, log_level: Optional[str]):
-        self.engine = create_engine(url)
-        if log_level is not None:
-            logging.getLogger("sqlalchemy").setLevel(log_level.upper())
+    def __init__(self, settings: DatabaseSettings):
+        self.engine = create_tuned_engine(settings)
+        if settings.log_level is not None:
+            logging.getLogger("sqlalchemy").setLevel(settings.log_level.upper())
         SQLModel.metadata.create_all(self.engine)
+        self._migrate()
         self._init_state()
+        self._init_counters()
+        self._init_history_dailies()
+        # logins of the users currently followed (`followed=True`) by id per
+        # model, kept in step with every write so that lookups cost no query
+        self._followed: Dict[Type[SQLModel], Dict[int, str]] = {}
+        # a write counts its transitions against the index, commits and updates
+        # the index under the lock, so that concurrent bots never count one twice
+        self._followed_locks: Dict[Type[SQLModel], threading.RLock] = {
+            Follower: threading.RLock(),
+            Following: threading.RLock(),
+        }
+        self._load_followed(Follower)
+        self._load_followed(Following)
 
     def close(self) -> None:
         self.engine.dispose()
 
+    def _migrate(self) -> None:
+        """
+        Add columns and indexes introduced by newer versions to existing
+        tables, new columns are filled with the model defaults.
+        """
+        inspector = inspect(self.engine)
+        preparer = self.engine.dialect.identifier_preparer
+
+        for mapper in SQLModel._sa_registry.mappers:
+            model, table = mapper.class_, mapper.local_table
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+
+                logger.info(f"Migrating: add column {table.name}.{column.name}")
+                column_type = column.type.compile(dialect=self.engine.dialect)
+                with self.engine.begin() as connection:
+                    connection.execute(
+                        text(
+                            f"ALTER TABLE {preparer.quote(table.name)} "
+                            f"ADD COLUMN {preparer.quote(column.name)} {column_type}"
+                        )
+                    )
+                    field = model.model_fields.get(column.name)
+                    default = (
+                        None
+                        if field is None
+                        else field.get_default(call_default_factory=True)
+                    )
+                    if default is not None:
+                        connection.execute(
+                            table.update().values({column.name: default})
+                        )
+
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+
+                logger.info(f"Migrating: create index {index.name}")
+                with self.engine.begin() as connection:
+                    index.create(bind=connection)
+
+    def _load_followed(self, model: Union[Type[Follower], Type[Following]]) -> None:
+        with Session(self.engine) as session:
+            rows = session.exec(
+                select(model.id, model.login).where(model.followed.is_(True))
+            ).all()
+        self._followed[model] = dict(rows)
+
+    def _index_followed(
+        self,
+        model: Union[Type[Follower], Type[Following]],
+        users: List[Tuple[int, str, bool]],
+    ) -> None:
+        followed = self._followed[model]
+        gained, lost = FOLLOW_EVENTS[model]
+        for user_id, login, is_followed in users:
+            if is_followed:
+                if user_id not in followed:
+                    record_event(user_id, gained)
+                followed[user_id] = login
+            elif followed.pop(user_id, None) is not None:
+                record_event(user_id, lost)
+
+    def is_follower(self, user_id: int) -> bool:
+        return user_id in self._followed[Follower]
+
+    def is_following(self, user_id: int) -> bool:
+        return user_id in self._followed[Following]
+
+    def follower_ids(self) -> array:
+        return array("q", self._followed[Follower])
+
+    def following_ids(self) -> array:
+        return array("q", self._followed[Following])
+
+    def changed_followers(self, users: List[User]) -> List[User]:
+        """
+        Users of a follower page that need a write: not followed yet, or
+        followed under another login.
+        """
+        followed = self._followed[Follower]
+        return [user for user in users if followed.get(user.id) != user.login]
+
+    def changed_followings(self, users: List[User]) -> List[User]:
+        """
+        Users of a following page that need a write: not followed yet, or
+        followed under another login.
+        """
+        followed = self._followed[Following]
+        return [user for user in users if followed.get(user.id) != user.login]
+
     def _init_state(self) -> None:
         with Session(self.engine) as session:
             if self.query_state(session) is None:
@@ -25,77 +253,300 @@ class Store:
                 session.add(state)
                 session.commit()
 
+    def _init_counters(self) -> None:
+        """
+        Seed the followed counters of a database created before counters
+        with the current counts.
+        """
+        with Session(self.engine) as session:
+            for model, name in FOLLOW_COUNTERS.items():
+                if session.exec(select(Counter).where(Counter.name == name)).first():
+                    continue
+                count = session.exec(
+                    select(func.count(model.id)).where(model.followed.is_(True))
+                ).one()
+                session.add(Counter(day=date.today(), name=name, value=count))
+            session.commit()
+
+    def _init_history_dailies(self) -> None:
+        """
+        Roll up the histories of a database created before the daily
+        rollup was kept on every insert.
+        """
+        with Session(self.engine) as session:
+            if session.exec(select(HistoryDaily)).first():
+                return
+            aggregates = self._aggregate_histories(true(), True, session)
+            self._upsert_history_dailies(
+                [history_daily(aggregate) for aggregate in aggregates], session
+            )
+
+    def _increment(self, counters: Dict[str, int], day: date, session: Session) -> None:
+        """
+        Add to the counters of `day` within the pending transaction, the
+        caller commits.
+        """
+        values = [
+            {"day": day, "name": name, "value": value}
+            for name, value in counters.items()
+            if value != 0
+        ]
+
+        def assign(table, new) -> List[Tuple[Any, Any]]:
+            return [(table.c.value, table.c.value + new.value)]
+
+        if self._upsert_all(Counter, values, assign, session, commit=False):
+            return
+        for value in values:
+            counter = session.get(Counter, (value["day"], value["name"]))
+            if counter is None:
+                counter = Counter(**value)
+            else:
+                counter.value += value["value"]
+            session.add(counter)
+
+    def _count_followed(
+        self,
+        model: Union[Type[Follower], Type[Following]],
+        users: List[Tuple[int, bool]],
+        session: Session,
+    ) -> None:
+        """
+        Count the followed-flag transitions of a pending write, the counter
+        commits together with the rows. The caller holds the model lock.
+        """
+        followed = self._followed[model]
+        delta = 0
+        for user_id, is_followed in users:
+            if is_followed and user_id not in followed:
+                delta += 1
+            elif not is_followed and user_id in followed:
+                delta -= 1
+        self._increment({FOLLOW_COUNTERS[model]: delta}, date.today(), session)
+
     def query_state(self, session: Session) -> Optional[State]:
         return session.exec(select(State)).one_or_none()
 
     def upsert(self, model: SQLModel, session: Session) -> None:
-        session.add(model)
-        session.commit()
-        session.refresh(model)
+        if isinstance(model, History) and model.id is None:
+            # a run is rolled up once, when it is recorded
+            aggregate = HistoryAggregate(
+                model.start_date.date(), model.create_by, model.state, 1, model.count
+            )
+            self._upsert_history_dailies(
+                [history_daily(aggregate)], session, commit=False
+            )
 
-    def upsert_follower(self, follower: Follower, session: Session) -> None:
-        db_follower = session.get(Follower, follower.id)
-        if db_follower is None:
-            session.add(follower)
+        if not isinstance(model, (Follower, Following)):
+            session.add(model)
             session.commit()
-        else:
-            follower.id = db_follower.id
-            db_follower.sync_id = follower.sync_id
-            db_follower.login = follower.login
-            if not db_follower.followed and follower.followed:
-                db_follower.last_follow_date = follower.last_follow_date
-
-            db_follower.followed = follower.followed
-            session.add(db_follower)
+            session.refresh(model)
+            return
+
+        with self._followed_locks[type(model)]:
+            self._count_followed(type(model), [(model.id, model.followed)], session)
+            session.add(model)
             session.commit()
+            session.refresh(model)
+            self._index_followed(type(model), [(model.id, model.login, model.followed)])
+
+    def upsert_follower(self, follower: Follower, session: Session) -> None:
+        with self._followed_locks[Follower]:
+            # read before commit, which expires the instance
+            indexed = [(follower.id, follower.login, follower.followed)]
+            self._count_followed(Follower, [(follower.id, follower.followed)], session)
+            db_follower = session.get(Follower, follower.id)
+            if db_follower is None:
+                session.add(follower)
+                session.commit()
+            else:
+                follower.id = db_follower.id
+                db_follower.sync_id = follower.sync_id
+                db_follower.login = follower.login
+                if not db_follower.followed and follower.followed:
+                    db_follower.last_follow_date = follower.last_follow_date
+
+                db_follower.followed = follower.followed
+                session.add(db_follower)
+                session.commit()
+            self._index_followed(Follower, indexed)
+
+    def _upsert_all(
+        self,
+        model: Type[SQLModel],
+        values: List[Dict],
+        assign: Callable[[Any, Any], List[Tuple[Any, Any]]],
+        session: Session,
+        commit: bool = True,
+    ) -> bool:
+        """
+        Upsert `values` with `INSERT ... ON CONFLICT` statements on the
+        primary key, `assign(table, new)` returns the `(column, value)`
+        assignments for existing rows in order. Returns False if the dialect
+        has no upsert support.
+        """
+        dialect = self.engine.dialect.name
+        if dialect not in UPSERT_DIALECTS:
+            return False
+        if not values:
+            return True
+
+        table = model.__table__
+        for chunk in chunked(values, len(table.columns)):
+            if dialect == "mysql":
+                stmt = mysql.insert(table).values(chunk)
+                new = stmt.inserted
+            else:
+                insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+                stmt = insert(table).values(chunk)
+                new = stmt.excluded
+
+            assignments = assign(table, new)
+            if dialect == "mysql":
+                stmt = stmt.on_duplicate_key_update(
+                    [(column.name, value) for column, value in assignments]
+                )
+            else:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=list(table.primary_key.columns),
+                    set_={column.name: value for column, value in assignments},
+                )
+            session.exec(stmt)
+
+        if commit:
+            session.commit()
+        return True
+
+    def _bulk_upsert(
+        self,
+        model: Union[Type[Follower], Type[Following]],
+        rows: List[Union[Follower, Following]],
+        transition_columns: List[str],
+        session: Session,
+    ) -> bool:
+        """
+        Upsert followers or followings in one statement. The
+        `transition_columns` only change when a row goes from not followed
+        to followed.
+        """
+
+        def assign(table, new) -> List[Tuple[Any, Any]]:
+            became_followed = and_(table.c.followed.is_(False), new.followed.is_(True))
+            assignments = [
+                (table.c.sync_id, new.sync_id),
+                (table.c.login, new.login),
+            ]
+            for column in transition_columns:
+                assignments.append(
+                    (
+                        table.c[column],
+                        case((became_followed, new[column]), else_=table.c[column]),
+                    )
+                )
+            # MySQL applies assignments in order, `followed` must be the last one
+            assignments.append((table.c.followed, new.followed))
+            return assignments
+
+        # a statement must not touch the same row twice
+        values: Dict[int, Dict] = {row.id: row.model_dump() for row in rows}
+        if self.engine.dialect.name not in UPSERT_DIALECTS:
+            return False
+        with self._followed_locks[model]:
+            self._count_followed(
+                model,
+                [(value["id"], value["followed"]) for value in values.values()],
+                session,
+            )
+            self._upsert_all(model, list(values.values()), assign, session)
+            self._index_followed(
+                model,
+                [
+                    (value["id"], value["login"], value["followed"])
+                    for value in values.values()
+                ],
+            )
+        return True
 
     def upsert_followers(self, followers: List[Follower], session: Session) -> None:
+        if self._bulk_upsert(Follower, followers, ["last_follow_date"], session):
+            return
         for follower in followers:
             self.upsert_follower(follower, session)
 
     def upsert_following(self, following: Following, session: Session) -> None:
-        db_following = session.get(Following, following.id)
-        if db_following is None:
-            session.add(following)
-            session.commit()
-        else:
-            following.id = db_following.id
-            db_following.sync_id = following.sync_id
-            db_following.login = following.login
-            if not db_following.followed and following.followed:
-                db_following.last_follow_date = following.last_follow_date
-                db_following.create_by = following.create_by
-
-            db_following.followed = following.followed
-            session.add(db_following)
-            session.commit()
+        with self._followed_locks[Following]:
+            # read before commit, which expires the instance
+            indexed = [(following.id, following.login, following.followed)]
+            self._count_followed(
+                Following, [(following.id, following.followed)], session
+            )
+            db_following = session.get(Following, following.id)
+            if db_following is None:
+                session.add(following)
+                session.commit()
+            else:
+                following.id = db_following.id
+                db_following.sync_id = following.sync_id
+                db_following.login = following.login
+                if not db_following.followed and following.followed:
+                    db_following.last_follow_date = following.last_follow_date
+                    db_following.create_by = following.create_by
+
+                db_following.followed = following.followed
+                session.add(db_following)
+                session.commit()
+            self._index_followed(Following, indexed)
 
     def upsert_followings(self, followings: List[Following], session: Session) -> None:
+        if self._bulk_upsert(
+            Following, followings, ["last_follow_date", "create_by"], session
+        ):
+            return
         [self.upsert_following(following, session) for following in followings]
 
-    def update_unfollow_followers(self, sync_id: int, session: Session) -> None:
-        session.exec(
-            update(Follower)
-            .where(
-                Follower.sync_id != sync_id,
-                Follower.sync_id.is_not(None),
-                Follower.followed.is_(True),
+    def _update_unfollow(
+        self,
+        model: Union[Type[Follower], Type[Following]],
+        known_ids: Iterable[int],
+        remote_ids: Iterable[int],
+        session: Session,
+    ) -> int:
+        """
+        Mark the users of `known_ids`, followed when the sweep started, that
+        are missing from `remote_ids`, the complete remote list, as
+        unfollowed. Only those rows are written, users followed during the
+        sweep are not in `known_ids` and stay followed.
+        """
+        followed = self._followed[model]
+        remote = set(remote_ids)
+        with self._followed_locks[model]:
+            removed = [
+                user_id
+                for user_id in known_ids
+                if user_id in followed and user_id not in remote
+            ]
+            for chunk in chunked(removed):
+                session.exec(
+                    update(model)
+                    .where(model.id.in_(chunk))
+                    .values(followed=False, unfollow_count=model.unfollow_count + 1)
+                )
+            self._increment(
+                {FOLLOW_COUNTERS[model]: -len(removed)}, date.today(), session
             )
-            .values(followed=False, unfollow_count=Follower.unfollow_count + 1)
-        )
-        session.commit()
+            session.commit()
+            self._index_followed(model, [(user_id, "", False) for user_id in removed])
+        return len(removed)
 
-    def update_unfollow_followings(self, sync_id: int, session: Session) -> None:
-        session.exec(
-            update(Following)
-            .where(
-                Following.sync_id != sync_id,
-                Following.sync_id.is_not(None),
-                Following.followed.is_(True),
-            )
-            .values(followed=False, unfollow_count=Following.unfollow_count + 1)
-        )
-        session.commit()
+    def update_unfollow_followers(
+        self, known_ids: Iterable[int], remote_ids: Iterable[int], session: Session
+    ) -> int:
+        return self._update_unfollow(Follower, known_ids, remote_ids, session)
+
+    def update_unfollow_followings(
+        self, known_ids: Iterable[int], remote_ids: Iterable[int], session: Session
+    ) -> int:
+        return self._update_unfollow(Following, known_ids, remote_ids, session)
 
     def query_not_following_followers(
         self, limit: int, unfollow_threshold: int, session: Session
@@ -142,24 +593,366 @@ class Store:
         return session.exec(query).all()
 
     def query_follower_count(self, session: Session) -> int:
-        return session.exec(
-            select(func.count(Follower.id)).where(Follower.followed.is_(True))
-        ).one()
+        return self.query_counter_total(FOLLOWER_COUNTER, session)
 
     def query_following_count(self, session: Session) -> int:
+        return self.query_counter_total(FOLLOWING_COUNTER, session)
+
+    def query_counter_total(self, name: str, session: Session) -> int:
         return session.exec(
-            select(func.count(Following.id)).where(Following.followed.is_(True))
+            select(func.coalesce(func.sum(Counter.value), 0)).where(
+                Counter.name == name
+            )
         ).one()
 
-    def query_histories(
-        self, start_date: datetime, end_date: datetime, session: Session
-    ) -> List[History]:
+    def aggregate_histories(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        session: Session,
+        by_day: bool = False,
+    ) -> List[HistoryAggregate]:
+        """
+        Number of runs and sum of counts of the histories within the window,
+        grouped by `create_by` and `state`, and by the start day of the run
+        if `by_day`. The whole days of the window are read from the
+        `HistoryDaily` rollup, which still holds pruned and archived runs,
+        and only the partial first and last days from `History`. Runs of a
+        partial day are no longer counted once they are pruned.
+        """
+        window = and_(
+            History.start_date >= start_date,
+            History.end_date <= end_date,
+        )
+        first_day = start_date.date()
+        if start_date > day_start(first_day):
+            first_day += timedelta(days=1)
+        # the day of `end_date` is partial, unless the window ends at its start
+        last_day = end_date.date()
+        if first_day >= last_day:
+            return self._aggregate_histories(window, by_day, session)
+
+        partial_days = or_(
+            History.start_date < day_start(first_day),
+            History.start_date >= day_start(last_day),
+        )
+        aggregates = self._aggregate_histories(
+            and_(window, partial_days), by_day, session
+        )
+
+        keys = [HistoryDaily.create_by, HistoryDaily.state]
+        if by_day:
+            keys.insert(0, HistoryDaily.day)
         query = (
-            select(History)
-            .where(
-                History.start_date >= start_date,
-                History.end_date <= end_date,
+            select(*keys, func.sum(HistoryDaily.runs), func.sum(HistoryDaily.count))
+            .where(HistoryDaily.day >= first_day, HistoryDaily.day < last_day)
+            .group_by(*keys)
+        )
+        totals: Dict[Tuple, List[int]] = {
+            (aggregate.day, aggregate.create_by, aggregate.state): [
+                aggregate.runs,
+                aggregate.count,
+            ]
+            for aggregate in aggregates
+        }
+        for row in session.exec(query).all():
+            key = tuple(row[:-2]) if by_day else (None, *row[:-2])
+            total = totals.setdefault(key, [0, 0])
+            total[0] += row[-2]
+            total[1] += row[-1]
+        return [
+            HistoryAggregate(day, create_by, state, runs, count)
+            for (day, create_by, state), (runs, count) in sorted(
+                totals.items(), key=lambda item: (item[0][0] or date.min, *item[0][1:])
             )
-            .order_by(History.id)
+        ]
+
+    def _aggregate_histories(
+        self, where: Any, by_day: bool, session: Session
+    ) -> List[HistoryAggregate]:
+        keys = [History.create_by, History.state]
+        if by_day:
+            keys.insert(0, func.date(History.start_date))
+        query = (
+            select(*keys, func.count(History.id), func.sum(History.count))
+            .where(where)
+            .group_by(*keys)
+            .order_by(*keys)
+        )
+
+        aggregates = []
+        for row in session.exec(query).all():
+            day = None
+            if by_day:
+                day, row = row[0], row[1:]
+                # SQLite returns the day as an ISO string
+                if isinstance(day, str):
+                    day = date.fromisoformat(day)
+            create_by, state, runs, count = row
+            aggregates.append(HistoryAggregate(day, create_by, state, runs, count))
+        return aggregates
+
+    def query_cached_responses(
+        self, limit: int, session: Session
+    ) -> List[CachedResponse]:
+        query = (
+            select(CachedResponse)
+            .order_by(CachedResponse.access_date.desc())
+            .limit(limit)
+        )
+        return session.exec(query).all()
+
+    def upsert_cached_responses(
+        self, cached_responses: List[CachedResponse], session: Session
+    ) -> None:
+        values = [response.model_dump() for response in cached_responses]
+
+        def assign(table, new) -> List[Tuple[Any, Any]]:
+            return [
+                (column, new[column.name])
+                for column in table.columns
+                if not column.primary_key
+            ]
+
+        if self._upsert_all(CachedResponse, values, assign, session):
+            return
+        for cached_response in cached_responses:
+            session.merge(cached_response)
+        session.commit()
+
+    def delete_cached_responses(self, keys: List[str], session: Session) -> None:
+        session.exec(delete(CachedResponse).where(CachedResponse.key.in_(keys)))
+        session.commit()
+
+    def query_cached_github_users(
+        self, ids: List[int], since: datetime, session: Session
+    ) -> List[CachedGithubUser]:
+        if not ids:
+            return []
+        query = select(CachedGithubUser).where(
+            CachedGithubUser.id.in_(ids),
+            CachedGithubUser.fetch_date >= since,
         )
         return session.exec(query).all()
+
+    def upsert_cached_github_users(
+        self, cached_users: List[CachedGithubUser], session: Session
+    ) -> None:
+        values: Dict[int, Dict] = {user.id: user.model_dump() for user in cached_users}
+
+        def assign(table, new) -> List[Tuple[Any, Any]]:
+            return [
+                (column, new[column.name])
+                for column in table.columns
+                if not column.primary_key
+            ]
+
+        if self._upsert_all(CachedGithubUser, list(values.values()), assign, session):
+            return
+        for user in cached_users:
+            session.merge(user)
+        session.commit()
+
+    def delete_cached_github_users(self, before: datetime, session: Session) -> None:
+        session.exec(
+            delete(CachedGithubUser).where(CachedGithubUser.fetch_date < before)
+        )
+        session.commit()
+
+    def query_rejected_user_ids(
+        self, ids: List[int], expr_hash: str, now: datetime, session: Session
+    ) -> Set[int]:
+        if not ids:
+            return set()
+        query = select(RejectedUser.id).where(
+            RejectedUser.id.in_(ids),
+            RejectedUser.expr_hash == expr_hash,
+            RejectedUser.recheck_date > now,
+        )
+        return set(session.exec(query).all())
+
+    def upsert_rejected_users(
+        self, rejected_users: List[RejectedUser], session: Session
+    ) -> None:
+        values: Dict[int, Dict] = {
+            user.id: user.model_dump() for user in rejected_users
+        }
+
+        def assign(table, new) -> List[Tuple[Any, Any]]:
+            return [
+                (table.c.expr_hash, new.expr_hash),
+                (table.c.recheck_date, new.recheck_date),
+            ]
+
+        if self._upsert_all(RejectedUser, list(values.values()), assign, session):
+            return
+        for user in rejected_users:
+            session.merge(user)
+        session.commit()
+
+    def delete_rejected_users(
+        self, expr_hash: str, now: datetime, session: Session
+    ) -> None:
+        session.exec(
+            delete(RejectedUser).where(
+                or_(
+                    RejectedUser.expr_hash != expr_hash,
+                    RejectedUser.recheck_date <= now,
+                )
+            )
+        )
+        session.commit()
+
+    def insert_events(self, events: List[Event], session: Session) -> None:
+        if not events:
+            return
+        table = Event.__table__
+        values = [event.model_dump(exclude={"id"}) for event in events]
+        for chunk in chunked(values, len(table.columns) - 1):
+            session.exec(table.insert().values(chunk))
+        session.commit()
+
+    def compact_events(
+        self, before: datetime, batch_size: int, session: Session
+    ) -> int:
+        """
+        Roll the events older than `before` into per-user summaries and
+        delete them, `batch_size` events per transaction. Returns the
+        number of compacted events.
+        """
+        compacted = 0
+        while True:
+            ids = session.exec(
+                select(Event.id)
+                .where(Event.date < before)
+                .order_by(Event.id)
+                .limit(batch_size)
+            ).all()
+            if not ids:
+                return compacted
+
+            batch = and_(Event.id.between(ids[0], ids[-1]), Event.date < before)
+            rows = session.exec(
+                select(
+                    Event.user_id,
+                    Event.kind,
+                    func.count(Event.id),
+                    func.min(Event.date),
+                    func.max(Event.date),
+                )
+                .where(batch)
+                .group_by(Event.user_id, Event.kind)
+            ).all()
+            summaries = [
+                EventSummary(
+                    user_id=user_id,
+                    kind=kind,
+                    count=count,
+                    first_date=first_date,
+                    last_date=last_date,
+                )
+                for user_id, kind, count, first_date, last_date in rows
+            ]
+            # the delete commits together with the summaries
+            session.exec(delete(Event).where(batch))
+            self._upsert_event_summaries(summaries, session)
+            compacted += len(ids)
+            logger.debug(f"Compacted {compacted} events")
+
+    def _upsert_event_summaries(
+        self, summaries: List[EventSummary], session: Session
+    ) -> None:
+        def assign(table, new) -> List[Tuple[Any, Any]]:
+            return [
+                (table.c.count, table.c.count + new.count),
+                (
+                    table.c.first_date,
+                    case(
+                        (new.first_date < table.c.first_date, new.first_date),
+                        else_=table.c.first_date,
+                    ),
+                ),
+                (
+                    table.c.last_date,
+                    case(
+                        (new.last_date > table.c.last_date, new.last_date),
+                        else_=table.c.last_date,
+                    ),
+                ),
+            ]
+
+        values = [summary.model_dump() for summary in summaries]
+        if self._upsert_all(EventSummary, values, assign, session):
+            return
+        for summary in summaries:
+            existing = session.get(EventSummary, (summary.user_id, summary.kind))
+            if existing is None:
+                session.add(summary)
+                continue
+            existing.count += summary.count
+            existing.first_date = min(existing.first_date, summary.first_date)
+            existing.last_date = max(existing.last_date, summary.last_date)
+            session.add(existing)
+        session.commit()
+
+    def prune_histories(
+        self, before: datetime, batch_size: int, archive: bool, session: Session
+    ) -> int:
+        """
+        Remove the histories of runs started before `before`, `batch_size`
+        rows per transaction. They are moved to `HistoryArchive` if
+        `archive`, otherwise deleted, their runs stay counted in the
+        `HistoryDaily` rollup. Returns the number of pruned histories.
+        """
+        pruned = 0
+        while True:
+            ids = session.exec(
+                select(History.id)
+                .where(History.start_date < before)
+                .order_by(History.id)
+                .limit(batch_size)
+            ).all()
+            if not ids:
+                return pruned
+
+            batch = and_(
+                History.id.between(ids[0], ids[-1]), History.start_date < before
+            )
+            # the delete commits together with the archived rows
+            if archive:
+                columns = list(History.__table__.columns)
+                session.exec(
+                    HistoryArchive.__table__.insert().from_select(
+                        [column.name for column in columns],
+                        select(*columns).where(batch),
+                    )
+                )
+            session.exec(delete(History).where(batch))
+            session.commit()
+            pruned += len(ids)
+            logger.debug(f"Pruned {pruned} histories")
+
+    def _upsert_history_dailies(
+        self, dailies: List[HistoryDaily], session: Session, commit: bool = True
+    ) -> None:
+        def assign(table, new) -> List[Tuple[Any, Any]]:
+            return [
+                (table.c.runs, table.c.runs + new.runs),
+                (table.c.count, table.c.count + new.count),
+            ]
+
+        values = [daily.model_dump() for daily in dailies]
+        if self._upsert_all(HistoryDaily, values, assign, session, commit=commit):
+            return
+        for daily in dailies:
+            existing = session.get(
+                HistoryDaily, (daily.day, daily.create_by, daily.state)
+            )
+            if existing is None:
+                session.add(daily)
+                continue
+            existing.runs += daily.runs
+            existing.count += daily.count
+            session.add(existing)
+        if commit:
+            session.commit()